@@ -1,4 +1,7 @@
 from __future__ import annotations
+import math
+import re
+import zlib
 from typing import Dict, List, Any
 
 
@@ -37,3 +40,80 @@ class EncoderReranker:
         for c in candidates:
             c["score"] = float(c.get("retriever_score", 0.0))
         return sorted(candidates, key=lambda x: x["score"], reverse=True)[:top_k]
+
+
+class HashedTfidfReranker(EncoderReranker):
+    """
+    Model-free, deterministic backend with the same rerank() contract.
+
+    Question and candidate texts (triple_to_text) become hashed token + character
+    n-gram TF-IDF vectors (IDF over the question and its candidates), and all
+    candidates are scored at once by sparse cosine similarity. Needs numpy/scipy only.
+    """
+
+    def __init__(self, model_name: str = "hashed-tfidf", n_features: int = 2 ** 18,
+                 char_ngrams: tuple = (3, 5), use_tokens: bool = True):
+        super().__init__(model_name=model_name)
+        self.n_features = n_features
+        self.char_ngrams = char_ngrams
+        self.use_tokens = use_tokens
+        # candidate triples repeat across questions: memoize their hashed tf vectors
+        self._tf_cache: Dict[str, tuple] = {}
+        self.max_cache_entries = 100_000
+
+    def _tf(self, text: str) -> tuple:
+        cached = self._tf_cache.get(text)
+        if cached is None:
+            feats = self._features(text)
+            cached = (list(feats.keys()), list(feats.values()))
+            if len(self._tf_cache) >= self.max_cache_entries:
+                self._tf_cache.clear()
+            self._tf_cache[text] = cached
+        return cached
+
+    def _features(self, text: str) -> Dict[int, float]:
+        text = " ".join(re.findall(r"\w+", text.lower()))
+        grams: List[str] = []
+        if self.use_tokens:
+            grams.extend("w:" + tok for tok in text.split())
+        padded = f" {text} "
+        lo, hi = self.char_ngrams
+        for n in range(lo, hi + 1):
+            grams.extend("c:" + padded[i:i + n] for i in range(len(padded) - n + 1))
+
+        counts: Dict[int, float] = {}
+        for g in grams:
+            h = zlib.crc32(g.encode("utf-8")) % self.n_features  # stable across runs, unlike hash()
+            counts[h] = counts.get(h, 0.0) + 1.0
+        # sublinear tf
+        return {h: 1.0 + math.log(c) for h, c in counts.items()}
+
+    def rerank(self, question: str, candidates: List[Dict[str, Any]], top_k: int = 10) -> List[Dict[str, Any]]:
+        if not candidates:
+            return []
+
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        indptr, cols, vals = [0], [], []
+        for text in [question] + [self.triple_to_text(c) for c in candidates]:
+            keys, tfs = self._tf(text)
+            cols.extend(keys)
+            vals.extend(tfs)
+            indptr.append(len(cols))
+        n_docs = len(candidates) + 1
+        X = csr_matrix((np.asarray(vals, dtype=np.float64), np.asarray(cols, dtype=np.int32), indptr),
+                       shape=(n_docs, self.n_features))
+
+        # smoothed idf, then L2-normalize rows
+        df = np.bincount(X.indices, minlength=self.n_features)
+        idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+        X.data *= idf[X.indices]
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0.0] = 1.0
+        X = csr_matrix(X.multiply(1.0 / norms[:, None]))
+
+        scores = (X[1:] @ X[0].T).toarray().ravel()
+        for c, score in zip(candidates, scores):
+            c["score"] = float(score)
+        return sorted(candidates, key=lambda x: x["score"], reverse=True)[:top_k]
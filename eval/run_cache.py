@@ -0,0 +1,225 @@
+"""
+Content-addressed cache for eval runs.
+
+A run key is a sha256 over the dev set, ICEWS file, implicit graph, the
+pipeline/retrieval source files, the encoder model name and the pipeline
+kwargs. Per-(question, config) ranks and stage outputs are stored in SQLite
+under that key, so re-running an unchanged evaluation is served from disk and
+only new or changed (question, config) pairs go through the pipeline.
+
+    python eval/run_cache.py list
+    python eval/run_cache.py diff <run_a> <run_b> [--config '{"use_reranker": false}']
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_DB = os.path.join(REPO_ROOT, ".eval_cache", "runs.sqlite")
+
+# code whose changes must invalidate cached ranks
+CODE_GLOBS = ("pipeline.py", "preprocess/*.py", "retrieval/*.py")
+
+# process() outputs kept per question; final_triples is trimmed to top_k
+STAGE_KEYS = (
+    "extracted_entities", "extracted_dates", "expanded_entities", "expansion_added",
+    "predicted_relations", "retrieved_candidates", "after_time_filter",
+    "rerank_input_capped", "final_count", "degradations",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    meta TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_key TEXT NOT NULL,
+    config_key TEXT NOT NULL,
+    question_key TEXT NOT NULL,
+    question TEXT NOT NULL,
+    config TEXT NOT NULL,
+    rank INTEGER,
+    stages TEXT NOT NULL,
+    PRIMARY KEY (run_key, config_key, question_key)
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+
+def _canonical(obj) -> str:
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def stage_outputs(results: Dict, top_k: int) -> Dict:
+    stages = {k: results[k] for k in STAGE_KEYS if k in results}
+    stages["final_triples"] = results.get("final_triples", [])[:top_k]
+    return stages
+
+
+class RunCache:
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ----------------------------------------------------------------- keys
+    def file_hash(self, path: str) -> str:
+        """sha256 of a file's contents, memoized on (size, mtime) so large ICEWS files are hashed once."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, sha256 FROM file_hashes WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, digest),
+            )
+        return digest
+
+    def code_hash(self, patterns: Iterable[str] = CODE_GLOBS) -> str:
+        h = hashlib.sha256()
+        for pattern in patterns:
+            for path in sorted(glob.glob(os.path.join(REPO_ROOT, pattern))):
+                h.update(os.path.relpath(path, REPO_ROOT).encode("utf-8"))
+                h.update(self.file_hash(path).encode("ascii"))
+        return h.hexdigest()
+
+    def run_key(self, files: Dict[str, Optional[str]], model_name: str, pipeline_config: Dict) -> str:
+        """Register a run and return its key. files maps a role ("dev", "icews", ...) to a path."""
+        hashes = {role: self.file_hash(p) if p else None for role, p in files.items()}
+        material = {"files": hashes, "code": self.code_hash(), "model": model_name, "pipeline": pipeline_config}
+        key = _sha256(_canonical(material))  # paths are not part of the key, only contents
+
+        meta = dict(material, files={role: {"path": files[role], "sha256": h} for role, h in hashes.items()})
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs VALUES (?, ?, ?)", (key, time.time(), _canonical(meta))
+            )
+        return key
+
+    @staticmethod
+    def config_key(config: Dict) -> str:
+        return _sha256(_canonical(config))
+
+    @staticmethod
+    def question_key(question: str) -> str:
+        return _sha256(question)
+
+    # --------------------------------------------------------------- results
+    def get(self, run_key: str, question: str, config: Dict) -> Optional[Tuple[Optional[int], Dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT rank, stages FROM results WHERE run_key = ? AND config_key = ? AND question_key = ?",
+                (run_key, self.config_key(config), self.question_key(question)),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put_many(self, run_key: str, config: Dict, rows: Iterable[Tuple[str, Optional[int], Dict]]) -> None:
+        """rows: (question, rank, stages)."""
+        ck = self.config_key(config)
+        cfg = _canonical(config)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_key, ck, self.question_key(q), q, cfg, rank, _canonical(stages))
+                 for q, rank, stages in rows],
+            )
+
+    def runs(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.run_key, r.created, r.meta, COUNT(x.question_key) FROM runs r "
+                "LEFT JOIN results x ON x.run_key = r.run_key GROUP BY r.run_key ORDER BY r.created"
+            ).fetchall()
+        return [{"run_key": k, "created": c, "meta": json.loads(m), "results": n} for k, c, m, n in rows]
+
+    def diff(self, run_a: str, run_b: str, config: Optional[Dict] = None) -> List[Dict]:
+        """(question, config) pairs present in both runs whose rank differs."""
+        sql = (
+            "SELECT a.question, a.config, a.rank, b.rank FROM results a JOIN results b "
+            "ON a.config_key = b.config_key AND a.question_key = b.question_key "
+            "WHERE a.run_key = ? AND b.run_key = ? AND a.rank IS NOT b.rank"
+        )
+        params: List = [run_a, run_b]
+        if config is not None:
+            sql += " AND a.config_key = ?"
+            params.append(self.config_key(config))
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY a.config, a.question", params).fetchall()
+        return [{"question": q, "config": json.loads(c), "rank_a": ra, "rank_b": rb} for q, c, ra, rb in rows]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _resolve(cache: RunCache, prefix: str) -> str:
+    matches = [r["run_key"] for r in cache.runs() if r["run_key"].startswith(prefix)]
+    if len(matches) != 1:
+        raise SystemExit(f"run key prefix {prefix!r} matches {len(matches)} runs")
+    return matches[0]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=DEFAULT_DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    d = sub.add_parser("diff")
+    d.add_argument("run_a")
+    d.add_argument("run_b")
+    d.add_argument("--config", default=None, help="JSON config to restrict the diff to")
+    args = ap.parse_args()
+
+    cache = RunCache(args.db)
+    if args.cmd == "list":
+        for r in cache.runs():
+            files = ", ".join(f"{role}={f['path']}" for role, f in r["meta"]["files"].items())
+            created = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["created"]))
+            print(f"{r['run_key'][:12]}  {created}  {r['results']:>6} results  {r['meta']['model']}  {files}")
+        return
+
+    run_a, run_b = _resolve(cache, args.run_a), _resolve(cache, args.run_b)
+    changed = cache.diff(run_a, run_b, json.loads(args.config) if args.config else None)
+    for row in changed:
+        rank_a = row["rank_a"] if row["rank_a"] is not None else "-"
+        rank_b = row["rank_b"] if row["rank_b"] is not None else "-"
+        print(f"{rank_a:>3} -> {rank_b:<3}  {_canonical(row['config'])}  {row['question']}")
+    print(f"\n{len(changed)} (question, config) pairs changed rank between {run_a[:12]} and {run_b[:12]}")
+
+
+if __name__ == "__main__":
+    main()
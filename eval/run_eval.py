@@ -1,16 +1,21 @@
+from __future__ import annotations
+
+import argparse
+import gc
 import json
+import multiprocessing as mp
 import re
-from typing import Dict, List, Optional
-import os, sys
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 import os, sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-import os; print(os.getcwd())
-
-from pipeline import TKGQAPipeline
-from preprocess.entity_extract import extract
+from eval.run_cache import DEFAULT_DB, RunCache, stage_outputs
 from eval.utils import compute_hit_mrr, write_table, format_table
 
+if TYPE_CHECKING:
+    from pipeline import TKGQAPipeline
+
 
 
 def quadruple_equal(candidate: Dict, gold: Dict) -> bool:
@@ -27,6 +32,59 @@ def _load_devset(path: str) -> List[Dict]:
         return json.load(f)
 
 
+class LazyPipeline:
+    """Builds TKGQAPipeline on first use, so fully cached runs never load spaCy or the encoder."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self._pipeline: Optional[TKGQAPipeline] = None
+
+    @property
+    def built(self) -> bool:
+        return self._pipeline is not None
+
+    def get(self) -> TKGQAPipeline:
+        if self._pipeline is None:
+            from pipeline import TKGQAPipeline
+            self._pipeline = TKGQAPipeline(**self.kwargs)
+        return self._pipeline
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def _rank_item(pipeline: TKGQAPipeline, item: Dict, top_k: int, flags: Dict) -> Tuple[Optional[int], Dict]:
+    results = pipeline.process(question=item["question_implicit"], **flags)
+    gold = item["quadruple"]
+
+    candidates = results.get("final_triples", [])
+    for rank, cand in enumerate(candidates[:top_k], start=1):
+        if quadruple_equal(cand, gold):
+            return rank, results
+    return None, results
+
+
+# Parallel mode: workers are forked after the pipeline is built, so the retriever's
+# index/events (and model weights) are shared copy-on-write instead of reloaded.
+_WORKER_PIPELINE: Optional[TKGQAPipeline] = None
+
+
+def _single_torch_thread() -> None:
+    # before any torch work in a process that will fork: forking after the
+    # intra-op (OpenMP) pool has started can hang the children
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _rank_task(task: Tuple[int, Dict, int, Dict]) -> Tuple[int, Optional[int], Dict]:
+    idx, item, top_k, flags = task
+    found_rank, results = _rank_item(_WORKER_PIPELINE, item, top_k, flags)
+    return idx, found_rank, stage_outputs(results, top_k)
+
+
 def evaluate_single_config(
     pipeline: TKGQAPipeline,
     data: List[Dict],
@@ -35,45 +93,95 @@ def evaluate_single_config(
     use_time_filter: bool = True,
     use_reranker: bool = True,
     verbose: bool = False,
+    workers: int = 1,
+    cache: Optional[RunCache] = None,
+    run_key: Optional[str] = None,
 ) -> Dict[str, float]:
-    ranks: List[Optional[int]] = []
-
-    for idx, item in enumerate(data, start=1):
-        question = item["question_implicit"]
-        gold = item["quadruple"]
-
-        results = pipeline.process(
-            question=question,
-            use_implicit=use_implicit,
-            use_time_filter=use_time_filter,
-            use_reranker=use_reranker,
-        )
-
-        candidates = results.get("final_triples", [])
-        found_rank: Optional[int] = None
-
-        for rank, cand in enumerate(candidates[:top_k], start=1):
-            if quadruple_equal(cand, gold):
-                found_rank = rank
-                break
-
-        ranks.append(found_rank)
-
-        if verbose:
+    flags = dict(use_implicit=use_implicit, use_time_filter=use_time_filter, use_reranker=use_reranker)
+    ranks: List[Optional[int]] = [None] * len(data)
+    stages: List[Dict] = [{} for _ in data]
+
+    # serve unchanged (question, config) pairs from the run cache
+    cache_config = dict(flags, top_k=top_k)
+    todo = list(range(len(data)))
+    if cache is not None and run_key:
+        todo = []
+        for i, item in enumerate(data):
+            hit = cache.get(run_key, item["question_implicit"], cache_config)
+            if hit is None:
+                todo.append(i)
+            else:
+                ranks[i], stages[i] = hit
+
+    if todo and workers > 1:
+        global _WORKER_PIPELINE
+        _single_torch_thread()
+        # build in the parent so workers inherit it instead of each loading their own
+        _WORKER_PIPELINE = pipeline.get() if isinstance(pipeline, LazyPipeline) else pipeline
+        gc.freeze()  # keep GC from touching (and un-sharing) the inherited pages
+        tasks = [(i, data[i], top_k, flags) for i in todo]
+        chunksize = max(1, len(tasks) // (workers * 4))
+        try:
+            with mp.get_context("fork").Pool(workers, initializer=_single_torch_thread) as pool:
+                for i, found_rank, item_stages in pool.imap_unordered(_rank_task, tasks, chunksize):
+                    ranks[i] = found_rank
+                    stages[i] = item_stages
+        finally:
+            gc.unfreeze()
+            _WORKER_PIPELINE = None
+    else:
+        for i in todo:
+            ranks[i], results = _rank_item(pipeline, data[i], top_k, flags)
+            stages[i] = stage_outputs(results, top_k)
+
+    if cache is not None and run_key and todo:
+        cache.put_many(run_key, cache_config, [(data[i]["question_implicit"], ranks[i], stages[i]) for i in todo])
+
+    if verbose:
+        for idx, (found_rank, item_stages) in enumerate(zip(ranks, stages), start=1):
+            expansion_added = item_stages.get("expansion_added", [])
             status = "✓" if found_rank else "✗"
-            expansion_added = results.get("expansion_added", [])
             extra = f" expanded={expansion_added}" if expansion_added else ""
             print(f"[{idx}/{len(data)}] {status}{extra}")
 
     return compute_hit_mrr(ranks, k=top_k)
 
 
+def benchmark_workers(pipeline: TKGQAPipeline, dev_path: str, max_workers: int, top_k: int = 10) -> List[Dict]:
+    """Time the full-pipeline config with 1..max_workers processes; metrics must not move."""
+    data = _load_devset(dev_path)
+    rows: List[Dict] = []
+    base_seconds = None
+
+    for workers in range(1, max_workers + 1):
+        t0 = time.perf_counter()
+        metrics = evaluate_single_config(pipeline, data, top_k=top_k, workers=workers)
+        seconds = time.perf_counter() - t0
+        base_seconds = base_seconds or seconds
+        rows.append(
+            {
+                "Workers": workers,
+                "Seconds": seconds,
+                "Speed-up": base_seconds / seconds if seconds else 0.0,
+                f"Hit@{top_k}": metrics[f"hit@{top_k}"],
+                "MRR": metrics["mrr"],
+            }
+        )
+
+    print(f"\nWorker scaling on {dev_path} (n={len(data)})")
+    print(format_table(rows, float_cols=("Seconds", "Speed-up", f"Hit@{top_k}", "MRR")))
+    return rows
+
+
 def run_ablation_study(
     pipeline: TKGQAPipeline,
     dev_path: str,
     top_k: int = 10,
     verbose: bool = False,
     out_dir: str = "results",
+    workers: int = 1,
+    cache: Optional[RunCache] = None,
+    run_key: Optional[str] = None,
 ) -> List[Dict]:
     data = _load_devset(dev_path)
 
@@ -91,6 +199,9 @@ def run_ablation_study(
             data=data,
             top_k=top_k,
             verbose=verbose,
+            workers=workers,
+            cache=cache,
+            run_key=run_key,
             **cfg,
         )
         rows.append(
@@ -121,6 +232,9 @@ def run_incremental_ablation(
     top_k: int = 10,
     verbose: bool = False,
     out_dir: str = "results",
+    workers: int = 1,
+    cache: Optional[RunCache] = None,
+    run_key: Optional[str] = None,
 ) -> List[Dict]:
     data = _load_devset(dev_path)
 
@@ -138,6 +252,9 @@ def run_incremental_ablation(
             data=data,
             top_k=top_k,
             verbose=verbose,
+            workers=workers,
+            cache=cache,
+            run_key=run_key,
             **cfg,
         )
         rows.append(
@@ -166,12 +283,16 @@ def debug_expansion(dev_path: str, limit: int = 10) -> None:
     data = _load_devset(dev_path)
     pattern = r"^.+\(([^)]+)\)$"
 
-    print(f"\nExpansion debug on {dev_path} (showing {min(limit, len(data))}/{len(data)})")
-    for idx, item in enumerate(data[:limit], start=1):
+    from preprocess.entity_extract import extract_many
+
+    items = data[:limit]
+    extractions = extract_many([item["question_implicit"] for item in items])
+
+    print(f"\nExpansion debug on {dev_path} (showing {len(items)}/{len(data)})")
+    for idx, (item, extraction) in enumerate(zip(items, extractions), start=1):
         question = item["question_implicit"]
         gold_s = item["quadruple"]["s"]
 
-        extraction = extract(question)
         entity_names = [e["name"] for e in extraction.get("entities", [])]
 
         expansion_adds = []
@@ -188,22 +309,101 @@ def debug_expansion(dev_path: str, limit: int = 10) -> None:
         print(f"  Expansion adds: {expansion_adds or 'nothing'}")
 
 
-def main():
-    RUN_DEBUG_EXPANSION = False
+def report_question_cache(pipeline: TKGQAPipeline) -> None:
+    if isinstance(pipeline, LazyPipeline) and not pipeline.built:
+        return
+    cache = pipeline.encoder.question_cache
+    if cache is None:
+        return
+    st = cache.stats()
+    print(
+        f"\nQuestion-embedding cache: hit rate {st['hit_rate']:.1%} "
+        f"({st['hits']}/{st['hits'] + st['misses']}), {st['entries']} entries, "
+        f"~{st['saved_seconds']:.1f}s encoder time saved (avg encode {st['avg_encode_ms']:.1f} ms)"
+    )
+    cache.save()
+
 
-    pipeline = TKGQAPipeline(
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dev", default="mini_qa_devset.json")
+    ap.add_argument("--top_k", type=int, default=10)
+    ap.add_argument("--workers", type=int, default=1, help="Process-pool size for evaluation")
+    ap.add_argument("--bench_workers", type=int, default=0,
+                    help="Report speed-up for 1..N workers instead of running the ablations")
+    ap.add_argument("--debug_expansion", action="store_true")
+    ap.add_argument("--question_cache", default=None,
+                    help="Persist question embeddings to this file between runs")
+    ap.add_argument("--run_cache", default=DEFAULT_DB, help="SQLite run cache of per-question ranks")
+    ap.add_argument("--no_run_cache", action="store_true", help="Recompute everything and don't record results")
+    ap.add_argument("--profile", default=None, metavar="DIR",
+                    help="Profile each pipeline stage (cProfile + tracemalloc) and write reports to DIR; "
+                         "implies --workers 1 --no_run_cache")
+    ap.add_argument("--trace", default=None, metavar="PATH",
+                    help="Append one JSONL stage trace per question to PATH (for scripts/replay_traces.py); "
+                         "implies --workers 1 --no_run_cache")
+    ap.add_argument("--encoder_autotune", action="store_true",
+                    help="Measure encode batching budgets at startup (a few extra encode passes)")
+    args = ap.parse_args()
+
+    trace_writer = None
+    if args.trace:
+        from tracing import TraceWriter
+        trace_writer = TraceWriter(args.trace)
+        args.workers, args.no_run_cache = 1, True
+
+    profiler = None
+    if args.profile:
+        from profiling import StageProfiler
+        profiler = StageProfiler(args.profile)
+        args.workers, args.no_run_cache = 1, True
+
+    if args.workers > 1 or args.bench_workers:
+        _single_torch_thread()  # the pipeline below is built in this process and then forked
+
+    pipeline_kwargs = dict(
         implicit_graph_path="implicit_relation_graph.json",
         icews_path="icews_2014_train.txt",
         encoder_model_name="BAAI/bge-large-en-v1.5",
         time_tolerance_days=30,
         device="cpu",
     )
-
-    if RUN_DEBUG_EXPANSION:
-        debug_expansion("mini_qa_devset.json", limit=10)
-
-    run_ablation_study(pipeline, dev_path="mini_qa_devset.json", top_k=10, verbose=False)
-    run_incremental_ablation(pipeline, dev_path="mini_qa_devset.json", top_k=10, verbose=False)
+    pipeline = LazyPipeline(**pipeline_kwargs, question_cache_path=args.question_cache, profiler=profiler,
+                            trace_writer=trace_writer, encoder_autotune=args.encoder_autotune)
+
+    cache, run_key = None, None
+    if not args.no_run_cache:
+        cache = RunCache(args.run_cache)
+        run_key = cache.run_key(
+            files={"dev": args.dev, "icews": pipeline_kwargs["icews_path"],
+                   "implicit_graph": pipeline_kwargs["implicit_graph_path"]},
+            model_name=pipeline_kwargs["encoder_model_name"],
+            pipeline_config={k: v for k, v in pipeline_kwargs.items()
+                             if k not in {"implicit_graph_path", "icews_path", "encoder_model_name"}},
+        )
+        print(f"Run cache {args.run_cache} (run {run_key[:12]})")
+
+    if args.debug_expansion:
+        debug_expansion(args.dev, limit=10)
+
+    if args.bench_workers:
+        benchmark_workers(pipeline, args.dev, max_workers=args.bench_workers, top_k=args.top_k)
+        return
+
+    run_ablation_study(pipeline, dev_path=args.dev, top_k=args.top_k, verbose=False, workers=args.workers,
+                       cache=cache, run_key=run_key)
+    run_incremental_ablation(pipeline, dev_path=args.dev, top_k=args.top_k, verbose=False, workers=args.workers,
+                             cache=cache, run_key=run_key)
+    if cache is not None:
+        print(f"\nRun cache: {cache.hits} served from disk, {cache.misses} computed")
+    report_question_cache(pipeline)
+    if trace_writer is not None:
+        trace_writer.close()
+        print(f"\nTraces: {trace_writer.written} records appended to {args.trace} ({trace_writer.dropped} dropped)")
+    if profiler is not None:
+        print(f"\nStage profiles written to {args.profile}:")
+        with open(profiler.dump(), "r", encoding="utf-8") as f:
+            print(f.read())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,227 @@
+"""
+Parameter sweep over time_tolerance_days, retriever_cap, rerank_cap and encoder_top_k.
+
+Each dev question is analyzed and retrieved once at the largest retriever cap,
+and every candidate any grid point could send to the reranker is scored by
+the encoder once. Grid points are then derived from those cached scores by
+replaying the pipeline's cheap steps per setting, so a large grid costs about
+one pipeline pass:
+
+  - retriever cap:  prefix of the max-cap candidate list (retrieval order doesn't depend on the cap)
+  - time filter:    per-candidate distance to the question's dates vs. the tolerance,
+                    with TimeFilter's keep-everything fallback when nothing matches
+  - rerank cap:     prefix of the filtered list
+  - rerank/top_k:   stable sort by cached score; inputs of top_k or fewer are left unsorted,
+                    as EncoderReranker.rerank does
+
+Encoder similarity is per (question, candidate), so cached scores equal what a
+fresh run computes. With a ranked retriever the retrieval order depends on the
+retriever's own tolerance_days, so only the time filter's tolerance is swept.
+
+    python eval/sweep.py --dev mini_qa_devset.json --tolerance 0,7,30,90 \
+        --retriever_cap 200,500,1000 --rerank_cap 50,100,200 --encoder_top_k 10
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from eval.run_eval import _load_devset, quadruple_equal
+from eval.utils import compute_hit_mrr, format_table, write_table
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+def _date_match_profile(candidates: Sequence, dates: List[Dict]):
+    """
+    Per candidate: (matches a month_year/year date, smallest |days| to an iso date).
+    TimeFilter keeps a candidate at tolerance t iff prefix_match or iso_dist <= t.
+    """
+    iso = [_parse_date(d.get("date")) for d in dates if d.get("format") == "iso" and d.get("date")]
+    iso = [d for d in iso if d is not None]
+    prefixes = [d["date"] for d in dates if d.get("format") in {"month_year", "year"} and d.get("date")]
+
+    prefix_match: List[bool] = []
+    iso_dist: List[float] = []
+    for cand in candidates:
+        triple_date = cand.get("date", "")
+        prefix_match.append(bool(triple_date) and any(triple_date.startswith(p) for p in prefixes))
+        parsed = _parse_date(triple_date) if triple_date else None
+        iso_dist.append(min((abs((parsed - d).days) for d in iso), default=float("inf"))
+                        if parsed is not None else float("inf"))
+    return prefix_match, iso_dist
+
+
+class PreparedQuestion:
+    __slots__ = ("candidates", "has_dates", "prefix_match", "iso_dist", "is_gold", "scores")
+
+    def __init__(self, candidates, has_dates, prefix_match, iso_dist, is_gold):
+        self.candidates = candidates
+        self.has_dates = has_dates
+        self.prefix_match = prefix_match
+        self.iso_dist = iso_dist
+        self.is_gold = is_gold
+        self.scores: Dict[int, float] = {}
+
+    def filtered(self, retriever_cap: int, tolerance: float, use_time_filter: bool) -> List[int]:
+        n = min(retriever_cap, len(self.candidates))
+        if not (use_time_filter and self.has_dates):
+            return list(range(n))
+        pm, dist = self.prefix_match, self.iso_dist
+        keep = [i for i in range(n) if pm[i] or dist[i] <= tolerance]
+        return keep or list(range(n))
+
+    def rank(self, retriever_cap: int, tolerance: float, rerank_cap: int, encoder_top_k: int,
+             eval_top_k: int, use_time_filter: bool, use_reranker: bool) -> Optional[int]:
+        pool = self.filtered(retriever_cap, tolerance, use_time_filter)[:rerank_cap]
+        if use_reranker and len(pool) > encoder_top_k:
+            scores = self.scores
+            top = sorted(pool, key=lambda i: scores[i], reverse=True)[:encoder_top_k]
+        else:
+            top = pool[:encoder_top_k]
+        for rank, i in enumerate(top[:eval_top_k], start=1):
+            if self.is_gold[i]:
+                return rank
+        return None
+
+
+def prepare(pipeline, data: List[Dict], grid: Dict[str, List], use_implicit: bool = True,
+            use_time_filter: bool = True, use_reranker: bool = True) -> List[PreparedQuestion]:
+    """Retrieve once at the largest cap and score every candidate some grid point would rerank."""
+    max_cap = max(grid["retriever_cap"])
+    max_rerank = max(grid["rerank_cap"])
+    min_top_k = min(grid["encoder_top_k"])
+
+    prepared: List[PreparedQuestion] = []
+    for item in data:
+        question = item["question_implicit"]
+        query = pipeline.analyze(question, use_implicit=use_implicit)
+        dates = query["dates"]
+        candidates = pipeline.retriever.retrieve(
+            query["expanded"],
+            cap=max_cap,
+            relations=query["relations"],
+            dates=dates if use_time_filter else None,
+        )
+        gold = item["quadruple"]
+        pq = PreparedQuestion(
+            candidates,
+            bool(dates),
+            *_date_match_profile(candidates, dates),
+            [quadruple_equal(c, gold) for c in candidates],
+        )
+
+        if use_reranker:
+            needed = set()
+            for cap, tol in itertools.product(grid["retriever_cap"], grid["time_tolerance_days"]):
+                pool = pq.filtered(cap, tol, use_time_filter)[:max_rerank]
+                if len(pool) > min_top_k:
+                    needed.update(pool)
+            order = sorted(needed)
+            if order:
+                scores = pipeline.encoder.score(question, [candidates[i] for i in order])
+                pq.scores = dict(zip(order, scores))
+        prepared.append(pq)
+    return prepared
+
+
+def run_sweep(pipeline, dev_path: str, grid: Dict[str, List], top_k: int = 10, out_dir: str = "results",
+              use_implicit: bool = True, use_time_filter: bool = True, use_reranker: bool = True) -> List[Dict]:
+    data = _load_devset(dev_path)
+
+    t0 = time.perf_counter()
+    prepared = prepare(pipeline, data, grid, use_implicit, use_time_filter, use_reranker)
+    prepare_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    rows: List[Dict] = []
+    for tol, rcap, cap, k in itertools.product(
+        grid["time_tolerance_days"], grid["retriever_cap"], grid["rerank_cap"], grid["encoder_top_k"]
+    ):
+        ranks = [pq.rank(rcap, tol, cap, k, top_k, use_time_filter, use_reranker) for pq in prepared]
+        metrics = compute_hit_mrr(ranks, k=top_k)
+        rows.append(
+            {
+                "time_tolerance_days": tol,
+                "retriever_cap": rcap,
+                "rerank_cap": cap,
+                "encoder_top_k": k,
+                f"Hit@{top_k}": metrics[f"hit@{top_k}"],
+                "MRR": metrics["mrr"],
+                "Hits": f"{metrics['hits']}/{metrics['total']}",
+            }
+        )
+    grid_seconds = time.perf_counter() - t0
+
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(dev_path))[0]
+    write_table(
+        rows,
+        csv_path=os.path.join(out_dir, f"sweep_{base}_k{top_k}.csv"),
+        json_path=os.path.join(out_dir, f"sweep_{base}_k{top_k}.json"),
+    )
+
+    best = sorted(rows, key=lambda r: (r["MRR"], r[f"Hit@{top_k}"]), reverse=True)[:10]
+    print(f"\nSweep on {dev_path} (n={len(data)}, {len(rows)} settings): "
+          f"retrieve+score {prepare_seconds:.1f}s, grid {grid_seconds:.2f}s")
+    print(format_table(best, float_cols=(f"Hit@{top_k}", "MRR")))
+    return rows
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dev", default="mini_qa_devset.json")
+    ap.add_argument("--top_k", type=int, default=10, help="Hit@k / MRR cutoff")
+    ap.add_argument("--tolerance", type=_int_list, default=[0, 7, 30, 90], help="time_tolerance_days values")
+    ap.add_argument("--retriever_cap", type=_int_list, default=[200, 500, 1000])
+    ap.add_argument("--rerank_cap", type=_int_list, default=[50, 100, 200])
+    ap.add_argument("--encoder_top_k", type=_int_list, default=[10])
+    ap.add_argument("--no_implicit", action="store_true")
+    ap.add_argument("--no_time_filter", action="store_true")
+    ap.add_argument("--no_reranker", action="store_true")
+    ap.add_argument("--out_dir", default="results")
+    ap.add_argument("--encoder_autotune", action="store_true",
+                    help="Measure encode batching budgets at startup (a few extra encode passes)")
+    args = ap.parse_args()
+
+    from pipeline import TKGQAPipeline
+
+    grid = {
+        "time_tolerance_days": args.tolerance,
+        "retriever_cap": args.retriever_cap,
+        "rerank_cap": args.rerank_cap,
+        "encoder_top_k": args.encoder_top_k,
+    }
+    pipeline = TKGQAPipeline(
+        implicit_graph_path="implicit_relation_graph.json",
+        icews_path="icews_2014_train.txt",
+        encoder_model_name="BAAI/bge-large-en-v1.5",
+        time_tolerance_days=max(args.tolerance),
+        device="cpu",
+        retriever_cap=max(args.retriever_cap),
+        encoder_autotune=args.encoder_autotune,
+    )
+    run_sweep(
+        pipeline, args.dev, grid, top_k=args.top_k, out_dir=args.out_dir,
+        use_implicit=not args.no_implicit,
+        use_time_filter=not args.no_time_filter,
+        use_reranker=not args.no_reranker,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,15 @@ def compute_hit_mrr(ranks: List[Optional[int]], k: int) -> Dict[str, float]:
     }
 
 
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank p-th percentile (p in 0..100); 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
 def write_table(rows: List[Dict], csv_path: str, json_path: str) -> None:
     if not rows:
         raise ValueError("rows is empty")
@@ -2,17 +2,103 @@
 Components:
 1. extractor.py        → Extract entities + dates from question
 2. implicit expansion  → Pattern-based: "Role (Country)" → add "Country"
-3. baseline_retriever  → Retrieve candidates (entity index lookup)
+   relation prior      → Rule-based question → ICEWS relation families
+3. baseline_retriever  → Retrieve candidates (entity index lookup, relation-matching first;
+                         duplicate quadruples collapsed at index time with a mention count;
+                         date index when no entity resolves)
 4. time_filter.py      → Filter by temporal constraints
 5. encoder_reranker.py → Rerank by semantic similarity
+
+With latency_budget_ms, process() degrades instead of running late: it skips the
+substring fallback, shrinks rerank_cap, switches to fallback_reranker or skips
+reranking, based on the time left and online per-stage cost estimates.
+
+With a profiler (profiling.StageProfiler), each stage runs under cProfile and
+tracemalloc and the profiler writes flamegraph/allocation reports on dump().
+With a trace_writer (tracing.TraceWriter), every question appends one JSONL
+record of its stage outputs (event ids) for scripts/replay_traces.py.
+
+The retriever and implicit-expansion lookup form one IndexSnapshot. reload()
+builds a new snapshot in the background (new ICEWS drop or edited graph) and
+swaps it in; requests finish on the snapshot they started with, and every
+result carries the index_version it was answered from.
+
+With compact=True, process() returns only event ids, scores and the stage
+counters (COMPACT_COUNTS order) as flat arrays; get_events(ids) fetches the
+full triples on demand.
+
+Two opt-in answer caches (LRU + TTL, keyed by index version): the candidate
+cache reuses the time-filtered candidates of questions with the same expanded
+entities, dates, relations and flags; the rerank cache reuses the ranking for
+the same candidate ids when the question embedding falls in the same SimHash
+bucket, so paraphrases skip candidate encoding (approximate).
+
+With embedding_store_path, triple embeddings persist in an append-only
+retrieval.embedding_store.EmbeddingStore and reranking encodes only candidates
+not stored yet. start_embedding_ingest() encodes the indexed events (and those
+of every later reload) in a background thread; call it after any fork, or fill
+the store ahead with scripts/ingest_embeddings.py (encoder.embedding_stats()
+has the backlog/coverage gauges).
 """
 
-from typing import Dict
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
 from retrieval.baseline_retriever import BaselineRetriever
 from retrieval.time_filter import TimeFilter
 from retrieval.encoder_reranker import EncoderReranker
-from preprocess.entity_extract import extract, wikipedia_candidates
+from retrieval.encoding_engine import AUTOTUNE_SAMPLE
+from retrieval.cache import LRUCache, QuestionEmbeddingCache, SimHasher
+from retrieval.embedding_store import EmbeddingStore
+from retrieval.candidate import Candidate
+from preprocess.entity_extract import extract, extract_many, wikipedia_candidates
 from preprocess.expansion import (load_implicit_graph, expand_entities_pattern_based)
+from preprocess.relation_classifier import RelationClassifier
+from tracing import TRACE_VERSION
+
+class StageCostModel:
+    """Online per-stage latency estimates (EWMA, ms), shared by all requests."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._estimates: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, ms: float) -> None:
+        with self._lock:
+            prev = self._estimates.get(stage)
+            self._estimates[stage] = ms if prev is None else prev + self.alpha * (ms - prev)
+
+    def estimate(self, stage: str, default: float = 0.0) -> float:
+        return self._estimates.get(stage, default)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._estimates)
+
+
+class IndexSnapshot:
+    """
+    Retriever + implicit-expansion lookup of one index version. Requests pin the
+    snapshot they start on; after a reload swaps in a new one, the old snapshot
+    is released once its last pin is gone.
+    """
+
+    __slots__ = ("version", "retriever", "implicit_lookup", "created", "pins", "retired_at")
+
+    def __init__(self, version: int, retriever, implicit_lookup: Dict):
+        self.version = version
+        self.retriever = retriever
+        self.implicit_lookup = implicit_lookup
+        self.created = time.time()
+        self.pins = 0
+        self.retired_at: Optional[float] = None
+
+
+# order of the stage counters in a compact result's "counts"
+COMPACT_COUNTS = ("retrieved_candidates", "after_time_filter", "rerank_input_capped", "final_count")
+
 
 # main pipeline class
 class TKGQAPipeline:
@@ -20,16 +106,210 @@ class TKGQAPipeline:
     def __init__(
         self,
         implicit_graph_path: str,
-        icews_path: str,
+        icews_path: Optional[str],
         encoder_model_name: str = "BAAI/bge-large-en-v1.5",
         time_tolerance_days: int = 30,
         device: str = "cpu",
         retriever_cap: int = 1000,
+        retriever_ranked: bool = False,
+        retriever_dedup: bool = True,
+        fallback_reranker=None,
+        retriever=None,
+        encoder_autotune: bool = False,
+        question_cache_size: int = 10_000,
+        question_cache_path: Optional[str] = None,
+        profiler=None,
+        trace_writer=None,
+        candidate_cache_size: int = 0,
+        rerank_cache_size: int = 0,
+        answer_cache_ttl: Optional[float] = 600.0,
+        rerank_cache_bits: int = 8,
+        embedding_store_path: Optional[str] = None,
     ):
-        self.implicit_lookup = load_implicit_graph(implicit_graph_path)
-        self.retriever = BaselineRetriever(events_path=icews_path, cap=retriever_cap)
+        self.implicit_graph_path = implicit_graph_path
+        self.icews_path = icews_path
+        # settings reload() rebuilds the retriever with; None for an injected retriever
+        self._retriever_kwargs = None
+        # any object with the BaselineRetriever.retrieve contract (e.g. ShardedRetriever)
+        if retriever is None:
+            self._retriever_kwargs = dict(
+                cap=retriever_cap,
+                ranked=retriever_ranked,
+                tolerance_days=time_tolerance_days,
+                dedup=retriever_dedup,
+            )
+            retriever = BaselineRetriever(events_path=icews_path, **self._retriever_kwargs)
+        self._snapshot = IndexSnapshot(1, retriever, load_implicit_graph(implicit_graph_path))
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.reload_stats = {
+            "reloads": 0,
+            "failures": 0,
+            "in_progress": False,
+            "draining": 0,
+            "last_build_s": None,
+            "last_drain_s": None,
+            "last_error": None,
+        }
         self.time_filter = TimeFilter(tolerance_days=time_tolerance_days)
-        self.encoder = EncoderReranker(model_name=encoder_model_name, device=device)
+        question_cache = None
+        if question_cache_size:
+            question_cache = QuestionEmbeddingCache(
+                max_entries=question_cache_size, persist_path=question_cache_path
+            )
+        embedding_store = None
+        if embedding_store_path:
+            embedding_store = EmbeddingStore(embedding_store_path, encoder_model_name)
+        self.encoder = EncoderReranker(
+            model_name=encoder_model_name, device=device, question_cache=question_cache,
+            embedding_store=embedding_store,
+        )
+        if encoder_autotune:
+            # tune encode batching on a spread of indexed events
+            events = getattr(self.retriever, "events", None) or []
+            step = max(1, len(events) // AUTOTUNE_SAMPLE)
+            self.encoder.autotune(events[::step][:AUTOTUNE_SAMPLE])
+        self.relation_classifier = RelationClassifier()
+        # cheaper reranker (same rerank() contract) used when the budget is tight
+        self.fallback_reranker = fallback_reranker
+        self.costs = StageCostModel()
+        self.profiler = profiler
+        self.trace_writer = trace_writer
+        # L1: time-filtered candidates per (index version, expanded entities, relations, dates, flags)
+        self.candidate_cache = (
+            LRUCache(max_entries=candidate_cache_size, ttl_seconds=answer_cache_ttl) if candidate_cache_size else None
+        )
+        # L2: rerank output per (index version, question-embedding bucket, top_k, candidate ids)
+        self.rerank_cache = (
+            LRUCache(max_entries=rerank_cache_size, ttl_seconds=answer_cache_ttl) if rerank_cache_size else None
+        )
+        self._simhash = SimHasher(bits=rerank_cache_bits)
+        self._ingesting = False
+
+    def _stage(self, name: str):
+        return self.profiler.stage(name) if self.profiler is not None else nullcontext()
+
+    # --- index snapshots / hot reload ---
+
+    @property
+    def retriever(self):
+        return self._snapshot.retriever
+
+    @property
+    def implicit_lookup(self) -> Dict:
+        return self._snapshot.implicit_lookup
+
+    @property
+    def index_version(self) -> int:
+        return self._snapshot.version
+
+    def _pin(self) -> IndexSnapshot:
+        """The current snapshot, kept alive until _unpin() even if a reload swaps it out."""
+        with self._swap_lock:
+            snap = self._snapshot
+            snap.pins += 1
+            return snap
+
+    def _unpin(self, snap: IndexSnapshot) -> None:
+        with self._swap_lock:
+            snap.pins -= 1
+            if snap.retired_at is not None and snap.pins == 0:
+                self._release(snap)
+
+    @contextmanager
+    def _pinned(self):
+        snap = self._pin()
+        try:
+            yield snap
+        finally:
+            self._unpin(snap)
+
+    def _release(self, snap: IndexSnapshot) -> None:
+        # caller holds _swap_lock; dropping the references frees the index
+        snap.retriever = None
+        snap.implicit_lookup = None
+        self.reload_stats["draining"] -= 1
+        self.reload_stats["last_drain_s"] = time.time() - snap.retired_at
+
+    def reload(
+        self,
+        icews_path: Optional[str] = None,
+        implicit_graph_path: Optional[str] = None,
+        retriever=None,
+        wait: bool = False,
+    ) -> threading.Thread:
+        """
+        Build a new index snapshot in a background thread and swap it in atomically.
+        Requests already running finish on the old snapshot, which is released when
+        they have drained. Paths default to the current ones; pass a built `retriever`
+        instead when the pipeline was created with an injected one (e.g. ShardedRetriever).
+        """
+        if retriever is None and self._retriever_kwargs is None:
+            raise ValueError("pipeline uses an injected retriever; pass the new one as retriever=")
+        if not self._reload_lock.acquire(blocking=False):
+            raise RuntimeError("a reload is already in progress")
+        self.reload_stats["in_progress"] = True
+        thread = threading.Thread(
+            target=self._reload,
+            args=(icews_path or self.icews_path, implicit_graph_path or self.implicit_graph_path, retriever),
+            name="index-reload",
+            daemon=True,
+        )
+        thread.start()
+        if wait:
+            thread.join()
+        return thread
+
+    def _reload(self, icews_path: Optional[str], implicit_graph_path: str, retriever) -> None:
+        try:
+            t = time.perf_counter()
+            implicit_lookup = load_implicit_graph(implicit_graph_path)
+            if retriever is None:
+                retriever = BaselineRetriever(events_path=icews_path, **self._retriever_kwargs)
+            build_s = time.perf_counter() - t
+
+            with self._swap_lock:
+                old = self._snapshot
+                self._snapshot = IndexSnapshot(old.version + 1, retriever, implicit_lookup)
+                self.icews_path, self.implicit_graph_path = icews_path, implicit_graph_path
+                old.retired_at = time.time()
+                self.reload_stats["draining"] += 1
+                if old.pins == 0:
+                    self._release(old)
+            if self._ingesting:
+                self.encoder.ingest(getattr(retriever, "events", None) or [])
+            # keys carry the index version; clearing just frees the stale entries now
+            for cache in (self.candidate_cache, self.rerank_cache):
+                if cache is not None:
+                    cache.clear()
+            self.reload_stats["reloads"] += 1
+            self.reload_stats["last_build_s"] = build_s
+            self.reload_stats["last_error"] = None
+        except Exception as e:
+            # keep serving the current snapshot
+            self.reload_stats["failures"] += 1
+            self.reload_stats["last_error"] = f"{type(e).__name__}: {e}"
+        finally:
+            self.reload_stats["in_progress"] = False
+            self._reload_lock.release()
+
+    def start_embedding_ingest(self) -> None:
+        """
+        Background-encode indexed events the embedding store doesn't have yet, and
+        those of every later reload (no-op without embedding_store_path). Starts a
+        thread: call it after forking, in the process that should do the encoding.
+        """
+        self._ingesting = True
+        self.encoder.ingest(getattr(self.retriever, "events", None) or [])
+
+    def reload_metrics(self) -> Dict:
+        snap = self._snapshot
+        return {
+            "index_version": snap.version,
+            "index_created": snap.created,
+            "n_events": getattr(snap.retriever, "n_events", None),
+            **self.reload_stats,
+        }
 
     def process(
         self,
@@ -39,61 +319,410 @@ class TKGQAPipeline:
         # ABLATION FLAGS
         use_implicit: bool = True,
         use_time_filter: bool = True,
-        use_reranker: bool = True
+        use_reranker: bool = True,
+        use_relation_prior: bool = True,
+        restrict_relations: bool = False,
+        latency_budget_ms: Optional[float] = None,
+        compact: bool = False,
     ) -> Dict:
 
-        results = {"question": question}
+        start = time.perf_counter()
+        degradations: List[str] = []
+
+        def elapsed_ms() -> float:
+            return (time.perf_counter() - start) * 1000.0
+
+        def remaining_ms() -> float:
+            if latency_budget_ms is None:
+                return float("inf")
+            return latency_budget_ms - elapsed_ms()
+
+        with self._pinned() as snap:
+            results = self._new_results(
+                question, use_implicit, use_time_filter, use_reranker, use_relation_prior, restrict_relations
+            )
+            results["index_version"] = snap.version
+
+            # Steps 1-2 + relation prior
+            query = self.analyze(question, use_implicit=use_implicit, use_relation_prior=use_relation_prior,
+                                 snapshot=snap)
+            self._record_query(results, query)
+
+            # Steps 3-4: Baseline retrieval + time filter
+            candidates, filtered = self._candidates(snap, query, use_time_filter, restrict_relations,
+                                                    latency_budget_ms, remaining_ms, degradations)
+            results["retrieved_candidates"] = len(candidates)
+            results["after_time_filter"] = len(filtered)
+
+            trace = None
+            if self.trace_writer is not None:
+                # ids/scores now: reranking overwrites candidate scores
+                trace = self._trace_record(snap, question, results, query, candidates, filtered,
+                                           rerank_cap, encoder_top_k)
+
+            # Budget: shrink the rerank cap, then fall back to a cheaper reranker or none
+            reranker = self.encoder if use_reranker else None
+            if reranker is not None and latency_budget_ms is not None and filtered:
+                rerank_cap, reranker = self._fit_rerank_budget(
+                    min(rerank_cap, len(filtered)), encoder_top_k, remaining_ms(), degradations
+                )
+
+            # Cap before reranking
+            filtered = filtered[:rerank_cap]
+            results["rerank_input_capped"] = len(filtered)
+
+            # Step 5: Encoder rerank
+            top_triples = self._rerank(snap, reranker, question, filtered, encoder_top_k)
+
+            return self._finish(results, query, top_triples, degradations, elapsed_ms(), trace, compact)
 
-        results["config"] = {
-            "use_implicit": use_implicit,
-            "use_time_filter": use_time_filter,
-            "use_reranker": use_reranker
+    def process_batch(
+        self,
+        questions: List[str],
+        encoder_top_k: int = 10,
+        rerank_cap: int = 200,
+        use_implicit: bool = True,
+        use_time_filter: bool = True,
+        use_reranker: bool = True,
+        use_relation_prior: bool = True,
+        restrict_relations: bool = False,
+        compact: bool = False,
+    ) -> List[Dict]:
+        """
+        process() over a micro-batch, in order: extraction runs through nlp.pipe and
+        all rerank inputs go through one encoder pass. No latency budget; each
+        result's latency_ms is its share of the batch time.
+        """
+        if not questions:
+            return []
+        start = time.perf_counter()
+
+        t = time.perf_counter()
+        with self._stage("extraction"):
+            extractions = list(extract_many(questions, batch_size=len(questions)))
+        self.costs.observe("extraction", (time.perf_counter() - t) * 1000.0 / len(questions))
+
+        pending = []  # (results, query, capped candidates, trace)
+        with self._pinned() as snap:
+            for question, extraction in zip(questions, extractions):
+                results = self._new_results(
+                    question, use_implicit, use_time_filter, use_reranker, use_relation_prior, restrict_relations
+                )
+                results["index_version"] = snap.version
+                query = self.analyze(question, use_implicit=use_implicit, use_relation_prior=use_relation_prior,
+                                     extraction=extraction, snapshot=snap)
+                self._record_query(results, query)
+
+                candidates, filtered = self._candidates(snap, query, use_time_filter, restrict_relations)
+                results["retrieved_candidates"] = len(candidates)
+                results["after_time_filter"] = len(filtered)
+
+                trace = None
+                if self.trace_writer is not None:
+                    trace = self._trace_record(snap, question, results, query, candidates, filtered,
+                                               rerank_cap, encoder_top_k)
+                filtered = filtered[:rerank_cap]
+                results["rerank_input_capped"] = len(filtered)
+                pending.append((results, query, filtered, trace))
+
+            # Step 5: one encoder pass over the whole batch (rerank-cache hits excluded)
+            if use_reranker:
+                # the rerank cache keys on question embeddings: encode them once for both
+                q_embs = None
+                if self.rerank_cache is not None:
+                    q_embs = self.encoder.encode_questions([results["question"] for results, _, _, _ in pending])
+                keys, tops = [], []
+                for i, (results, _, filtered, _) in enumerate(pending):
+                    key, top = self._rerank_cache_get(snap, filtered, encoder_top_k,
+                                                      q_embs[i : i + 1] if q_embs is not None else None)
+                    keys.append(key)
+                    tops.append(top)
+                todo = [i for i, top in enumerate(tops) if top is None]
+                t = time.perf_counter()
+                with self._stage("rerank"):
+                    reranked = self.encoder.rerank_many(
+                        [(pending[i][0]["question"], pending[i][2]) for i in todo], top_k=encoder_top_k,
+                        question_embs=q_embs[todo] if q_embs is not None else None,
+                    )
+                scored = [len(pending[i][2]) for i in todo if len(pending[i][2]) > encoder_top_k]
+                if scored:
+                    self.costs.observe("rerank_per_item",
+                                       (time.perf_counter() - t) * 1000.0 / (sum(scored) + len(scored)))
+                for i, top in zip(todo, reranked):
+                    tops[i] = top
+                    self._rerank_cache_put(keys[i], top)
+            else:
+                tops = [filtered[:encoder_top_k] for _, _, filtered, _ in pending]
+
+            latency_ms = (time.perf_counter() - start) * 1000.0 / len(questions)
+            return [
+                self._finish(results, query, top_triples, [], latency_ms, trace, compact)
+                for (results, query, _, trace), top_triples in zip(pending, tops)
+            ]
+
+    @staticmethod
+    def _new_results(question: str, use_implicit: bool, use_time_filter: bool, use_reranker: bool,
+                     use_relation_prior: bool, restrict_relations: bool) -> Dict:
+        return {
+            "question": question,
+            "config": {
+                "use_implicit": use_implicit,
+                "use_time_filter": use_time_filter,
+                "use_reranker": use_reranker,
+                "use_relation_prior": use_relation_prior,
+                "restrict_relations": restrict_relations,
+            },
         }
 
-        # Step 1: Extract entities + dates
-        extraction = extract(question)
+    @staticmethod
+    def _record_query(results: Dict, query: Dict) -> None:
+        results["extracted_entities"] = [e["name"] for e in query["entities"]]
+        results["extracted_dates"] = query["dates"]
+        results["expanded_entities"] = query["expanded"]
+        results["expansion_added"] = query["expansion_added"]
+        if query["families"] is not None:
+            results["predicted_relations"] = query["families"]
+        results["matched_relations"] = query["relations"]
+
+    def _retrieve(self, snap: IndexSnapshot, query: Dict, use_time_filter: bool, restrict_relations: bool,
+                  latency_budget_ms: Optional[float] = None, remaining_ms=None,
+                  degradations: Optional[List[str]] = None) -> List:
+        expanded = query["expanded"]
+        # (dates only feed ranked retrieval when time filtering is on)
+        retrieve_kwargs = dict(
+            relations=query["relations"],
+            restrict_relations=restrict_relations,
+            dates=query["dates"] if use_time_filter else None,
+        )
+        t = time.perf_counter()
+        with self._stage("retrieve"):
+            if latency_budget_ms is None:
+                return snap.retriever.retrieve(expanded, **retrieve_kwargs)
+
+            # exact lookups first; the substring fallback is a separately budgeted stage
+            candidates = snap.retriever.retrieve(expanded, allow_fallback=False, **retrieve_kwargs)
+            self.costs.observe("retrieve", (time.perf_counter() - t) * 1000.0)
+            if candidates:
+                return candidates
+            if expanded and self.costs.estimate("fallback") <= remaining_ms():
+                t = time.perf_counter()
+                candidates = snap.retriever.retrieve(expanded, **retrieve_kwargs)
+                self.costs.observe("fallback", (time.perf_counter() - t) * 1000.0)
+                return candidates
+            if expanded:
+                degradations.append("skip_fallback")
+            # the date window still applies without the substring scan (and without entities)
+            if retrieve_kwargs["dates"]:
+                candidates = snap.retriever.retrieve_by_date(**retrieve_kwargs)
+            return candidates
+
+    def _candidates(self, snap: IndexSnapshot, query: Dict, use_time_filter: bool, restrict_relations: bool,
+                    latency_budget_ms: Optional[float] = None, remaining_ms=None,
+                    degradations: Optional[List[str]] = None):
+        """(retrieved, time-filtered) candidates, served from the candidate cache when possible."""
+        key = None
+        if self.candidate_cache is not None:
+            dates = tuple((d.get("date"), d.get("format")) for d in query["dates"]) if use_time_filter else ()
+            key = (snap.version, tuple(query["expanded"]), tuple(query["relations"]), dates,
+                   use_time_filter, restrict_relations)
+            hit = self.candidate_cache.get(key)
+            if hit is not None:
+                # fresh views: reranking writes scores onto them
+                retrieved, kept = hit
+                candidates = [Candidate(i, event, score) for i, event, score in retrieved]
+                return candidates, [candidates[j] for j in kept]
+
+        n_degraded = len(degradations) if degradations is not None else 0
+        candidates = self._retrieve(snap, query, use_time_filter, restrict_relations,
+                                    latency_budget_ms, remaining_ms, degradations)
+        filtered = self._filter(candidates, query["dates"], use_time_filter)
+
+        if key is not None and (degradations is None or len(degradations) == n_degraded):
+            pos = {id(c): j for j, c in enumerate(candidates)}
+            self.candidate_cache.put(key, (
+                tuple((c.event_id, c.event, c.score) for c in candidates),
+                tuple(pos[id(c)] for c in filtered),
+            ))
+        return candidates, filtered
+
+    def _filter(self, candidates: List, dates: List[Dict], use_time_filter: bool) -> List:
+        with self._stage("time_filter"):
+            if use_time_filter and dates:
+                return self.time_filter.filter(candidates, dates)
+            return candidates
+
+    def _rerank(self, snap: IndexSnapshot, reranker, question: str, filtered: List, encoder_top_k: int) -> List:
+        if reranker is None or not filtered:
+            return filtered[:encoder_top_k]
+        key = q_emb = None
+        if reranker is self.encoder and self.rerank_cache is not None and len(filtered) > encoder_top_k:
+            q_emb = self.encoder.encode_question(question)
+            key, top_triples = self._rerank_cache_get(snap, filtered, encoder_top_k, q_emb)
+            if top_triples is not None:
+                return top_triples
+        t = time.perf_counter()
+        with self._stage("rerank"):
+            if q_emb is not None:  # don't encode the question a second time on a miss
+                top_triples = reranker.rerank(question, filtered, top_k=encoder_top_k, question_emb=q_emb)
+            else:
+                top_triples = reranker.rerank(question, filtered, top_k=encoder_top_k)
+        if len(filtered) > encoder_top_k:  # shorter inputs are returned without scoring
+            stage = "rerank_per_item" if reranker is self.encoder else "fallback_rerank_per_item"
+            self.costs.observe(stage, (time.perf_counter() - t) * 1000.0 / (len(filtered) + 1))
+        self._rerank_cache_put(key, top_triples)
+        return top_triples
+
+    def _rerank_cache_get(self, snap: IndexSnapshot, filtered: List, encoder_top_k: int, q_emb):
+        """
+        (key, top candidates or None). Questions whose embeddings (q_emb, from
+        encoder.encode_question) share a SimHash bucket and that rerank the same
+        candidate ids reuse one ranking.
+        """
+        if self.rerank_cache is None or len(filtered) <= encoder_top_k:
+            return None, None
+        bucket = self._simhash(q_emb)
+        key = (snap.version, bucket, encoder_top_k, tuple(c.event_id for c in filtered))
+        hit = self.rerank_cache.get(key)
+        if hit is None:
+            return key, None
+        by_id = {c.event_id: c for c in filtered}
+        top_triples = []
+        for event_id, score in hit:
+            c = by_id[event_id]
+            c.retriever_score = c.score  # as EncoderReranker.rerank does
+            c.score = score
+            top_triples.append(c)
+        return key, top_triples
+
+    def _rerank_cache_put(self, key, top_triples: List) -> None:
+        if key is not None:
+            self.rerank_cache.put(key, tuple((c.event_id, c.score) for c in top_triples))
+
+    def answer_cache_stats(self) -> Dict[str, Dict]:
+        return {
+            name: cache.stats()
+            for name, cache in (("candidates", self.candidate_cache), ("rerank", self.rerank_cache))
+            if cache is not None
+        }
+
+    def _finish(self, results: Dict, query: Dict, top_triples: List, degradations: List[str],
+                latency_ms: float, trace: Optional[Dict], compact: bool = False) -> Dict:
+        if trace is not None:
+            trace["final"] = [t.event_id for t in top_triples]
+            trace["degradations"] = degradations
+            trace["latency_ms"] = round(latency_ms, 3)
+            self.trace_writer.write(trace)
+
+        if compact:
+            return {
+                "index_version": results["index_version"],
+                "event_ids": [t.event_id for t in top_triples],
+                "scores": [t.score for t in top_triples],
+                "counts": [results[k] for k in COMPACT_COUNTS[:-1]] + [len(top_triples)],
+                "degradations": degradations,
+                "latency_ms": latency_ms,
+            }
+
+        # serialize views only at the API boundary
+        results["final_triples"] = [t.to_dict() for t in top_triples]
+        results["final_count"] = len(top_triples)
+
+        # Step 6: Wikipedia candidates
+        results["wikipedia_candidates"] = wikipedia_candidates(query["entities"])
+
+        results["degradations"] = degradations
+        results["latency_ms"] = latency_ms
+        return results
+
+    def get_events(self, ids: List[int], index_version: Optional[int] = None) -> List[Dict]:
+        """Full triples for compact-mode event_ids; pass the result's index_version to catch a reload in between."""
+        with self._pinned() as snap:  # a reload mid-call would otherwise release the retriever
+            if index_version is not None and index_version != snap.version:
+                raise ValueError(f"event ids are from index version {index_version}, current is {snap.version}")
+            return snap.retriever.get_events(ids)
+
+    def _trace_record(self, snap: IndexSnapshot, question: str, results: Dict, query: Dict, candidates, filtered,
+                      rerank_cap: int, encoder_top_k: int) -> Dict:
+        record = {
+            "v": TRACE_VERSION,
+            "ts": time.time(),
+            "question": question,
+            "config": results["config"],
+            "entities": [{"name": e["name"], "type": e.get("type")} for e in query["entities"]],
+            "dates": query["dates"],
+            "expanded": query["expanded"],
+            "relations": query["relations"],
+            "tolerance_days": self.time_filter.tolerance_days,
+            "rerank_cap": rerank_cap,
+            "encoder_top_k": encoder_top_k,
+            # what event ids index: replay refuses a trace without both
+            "retriever": type(snap.retriever).__name__,
+            "n_events": getattr(snap.retriever, "n_events", None),
+            "index_version": snap.version,
+            "retrieved": [c.event_id for c in candidates],
+            "filtered": [c.event_id for c in filtered],
+        }
+        if any(c.score != 1.0 for c in candidates):  # ranked retrieval
+            record["retrieved_scores"] = [round(c.score, 6) for c in candidates]
+        return record
+
+    def analyze(self, question: str, use_implicit: bool = True, use_relation_prior: bool = True,
+                extraction: Optional[Dict] = None, snapshot: Optional[IndexSnapshot] = None) -> Dict:
+        """Extraction, expansion and relation prior: everything retrieval needs from the question."""
+        snap = snapshot or self._snapshot
+        # Step 1: Extract entities + dates (unless already extracted in a batch)
+        if extraction is None:
+            t = time.perf_counter()
+            with self._stage("extraction"):
+                extraction = extract(question)
+            self.costs.observe("extraction", (time.perf_counter() - t) * 1000.0)
         entities = extraction["entities"]
-        dates = extraction["dates"]
-        results["extracted_entities"] = [e["name"] for e in entities]
-        results["extracted_dates"] = dates
 
         # Step 2: Expand entities (PATTERN-BASED expansion)
-        if use_implicit:
-            expanded = expand_entities_pattern_based(entities, self.implicit_lookup)
-        else:
-            expanded = [e["name"] for e in entities]
-        results["expanded_entities"] = expanded
-        
+        with self._stage("expansion"):
+            if use_implicit:
+                expanded = expand_entities_pattern_based(entities, snap.implicit_lookup)
+            else:
+                expanded = [e["name"] for e in entities]
+
         # Debug: show what expansion added
         original_names = set(e["name"] for e in entities)
         expansion_added = [e for e in expanded if e not in original_names]
-        results["expansion_added"] = expansion_added
-
-        # Step 3: Baseline retrieval
-        candidates = self.retriever.retrieve(expanded)
-        results["retrieved_candidates"] = len(candidates)
-
-        # Step 4: Time filter
-        if use_time_filter and dates:
-            filtered = self.time_filter.filter(candidates, dates)
-        else:
-            filtered = candidates
-        results["after_time_filter"] = len(filtered)
-
-        # Cap before reranking
-        filtered = filtered[:rerank_cap]
-        results["rerank_input_capped"] = len(filtered)
-
-        # Step 5: Encoder rerank
-        if use_reranker and filtered:
-            top_triples = self.encoder.rerank(question, filtered, top_k=encoder_top_k)
-        else:
-            top_triples = filtered[:encoder_top_k]
-        
-        results["final_triples"] = top_triples
-        results["final_count"] = len(top_triples)
 
-        # Step 6: Wikipedia candidates
-        results["wikipedia_candidates"] = wikipedia_candidates(entities)
-        return results
+        # Relation prior: likely ICEWS relations, preferred before the caps
+        families, relations = None, []
+        if use_relation_prior:
+            families = self.relation_classifier.predict(question)
+            relations = snap.retriever.match_relations(families)
+
+        return {
+            "entities": entities,
+            "dates": extraction["dates"],
+            "expanded": expanded,
+            "expansion_added": expansion_added,
+            "families": families,
+            "relations": relations,
+        }
+
+    def _fit_rerank_budget(self, n: int, top_k: int, remaining: float, degradations: List[str]):
+        """Largest rerank input (and reranker) predicted to finish within `remaining` ms."""
+        per_item = self.costs.estimate("rerank_per_item")
+        if per_item <= 0 or per_item * (n + 1) <= remaining:
+            # (no estimate yet: nothing to size the cap by)
+            return n, self.encoder
+
+        fit = int(remaining / per_item) - 1  # < n, since n items didn't fit
+        # reranking top_k or fewer items can't change what is returned
+        if fit > top_k:
+            degradations.append(f"shrink_rerank_cap:{n}->{fit}")
+            return fit, self.encoder
+
+        if self.fallback_reranker is not None:
+            cheap = self.costs.estimate("fallback_rerank_per_item")
+            if cheap * (n + 1) <= remaining:
+                degradations.append("fallback_reranker")
+                return n, self.fallback_reranker
+
+        degradations.append("skip_reranker")
+        return n, None
 
@@ -0,0 +1,216 @@
+"""
+Pre-fork HTTP server for TKGQAPipeline.
+
+The parent builds and warms ONE pipeline (spaCy, encoder weights, ICEWS index),
+calls gc.freeze() so refcount/GC passes don't dirty those pages, then forks N
+workers that share them copy-on-write and accept on one listening socket.
+The parent respawns dead workers and periodically logs per-worker RSS/PSS/USS
+(from /proc/<pid>/smaps_rollup) so page sharing can be checked under load.
+
+    python prefork_server.py --workers 4 --port 8080
+    curl -s localhost:8080/answer -d '{"question": "Which country did Xi Jinping visit on 2014-06-29?"}'
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, List
+
+from pipeline import TKGQAPipeline
+
+
+# process() keyword arguments a request may set
+_REQUEST_OPTIONS = (
+    "encoder_top_k", "rerank_cap", "use_implicit", "use_time_filter",
+    "use_reranker", "use_relation_prior", "restrict_relations", "latency_budget_ms", "compact",
+)
+
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """RSS / PSS / USS / shared in kB for one process (Linux)."""
+    fields: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return {}
+
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def warm_up(pipeline: TKGQAPipeline, questions: List[str]) -> None:
+    # touch every lazily-initialized path once before forking
+    for q in questions:
+        pipeline.process(q)
+
+
+def make_handler(pipeline: TKGQAPipeline):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: Dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"pid": os.getpid(), **memory_usage(os.getpid())})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/answer":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                req = json.loads(self.rfile.read(length) or b"{}")
+                question = req["question"]
+            except (ValueError, KeyError, TypeError) as e:  # TypeError: body isn't a JSON object
+                self._send(400, {"error": f"bad request: {e}"})
+                return
+
+            options = {k: req[k] for k in _REQUEST_OPTIONS if k in req}
+            try:
+                result = pipeline.process(question, **options)
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._send(200, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def set_torch_threads(n: int) -> None:
+    try:
+        import torch
+        torch.set_num_threads(n)
+    except ImportError:
+        pass
+
+
+def serve_worker(sock: socket.socket, pipeline: TKGQAPipeline, torch_threads: int, ingest: bool = False) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    set_torch_threads(torch_threads)
+    if ingest:
+        # threads don't survive fork: the ingest thread has to start here
+        pipeline.start_embedding_ingest()
+
+    server = HTTPServer(sock.getsockname()[:2], make_handler(pipeline), bind_and_activate=False)
+    server.socket = sock
+    server.serve_forever()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--icews", default="icews_2014_train.txt")
+    ap.add_argument("--graph", default="implicit_relation_graph.json")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--warmup", default="mini_qa_devset.json", help="QA json whose questions warm the pipeline")
+    ap.add_argument("--torch_threads", type=int, default=1)
+    ap.add_argument("--report_interval", type=float, default=30.0, help="Seconds between memory reports")
+    ap.add_argument("--encoder_autotune", action="store_true",
+                    help="Measure encode batching budgets at startup (a few extra encode passes)")
+    ap.add_argument("--embedding_store", default=None,
+                    help="Persistent triple-embedding store shared by the workers; worker 0 fills it in the background")
+    args = ap.parse_args()
+
+    # before any torch work here: the parent forks, and forking after the
+    # intra-op (OpenMP) pool has started with more threads can hang the workers
+    set_torch_threads(args.torch_threads)
+    pipeline = TKGQAPipeline(
+        implicit_graph_path=args.graph,
+        icews_path=args.icews,
+        encoder_model_name=args.model,
+        encoder_autotune=args.encoder_autotune,
+        embedding_store_path=args.embedding_store,
+    )
+    with open(args.warmup, "r", encoding="utf-8") as f:
+        warm_up(pipeline, [ex.get("question_implicit") or ex["question"] for ex in json.load(f)][:20])
+
+    sock = socket.create_server((args.host, args.port), backlog=128)
+
+    # everything allocated so far is shared with the workers; freeze it out of GC
+    gc.collect()
+    gc.freeze()
+
+    workers: Dict[int, int] = {}  # pid -> slot
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # one worker encodes the backlog; the others read what it appends
+                serve_worker(sock, pipeline, args.torch_threads, ingest=slot == 0)
+            finally:
+                os._exit(0)
+        workers[pid] = slot
+
+    def shutdown(signum, frame):
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for slot in range(args.workers):
+        spawn(slot)
+    print(f"serving on http://{args.host}:{args.port} with {args.workers} workers "
+          f"(parent {os.getpid()}, {memory_usage(os.getpid()).get('rss_kb', 0) // 1024} MB RSS)",
+          file=sys.stderr)
+
+    next_report = time.monotonic() + args.report_interval
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in workers:
+            slot = workers.pop(pid)
+            print(f"worker {pid} (slot {slot}) exited with {status}; respawning", file=sys.stderr)
+            spawn(slot)
+
+        if time.monotonic() >= next_report:
+            next_report += args.report_interval
+            total_pss = 0
+            for wpid, slot in sorted(workers.items(), key=lambda x: x[1]):
+                m = memory_usage(wpid)
+                total_pss += m.get("pss_kb", 0)
+                print(f"[mem] worker {slot} pid={wpid} rss={m.get('rss_kb', 0) // 1024}MB "
+                      f"pss={m.get('pss_kb', 0) // 1024}MB uss={m.get('uss_kb', 0) // 1024}MB "
+                      f"shared={m.get('shared_kb', 0) // 1024}MB", file=sys.stderr)
+            parent = memory_usage(os.getpid())
+            total_pss += parent.get("pss_kb", 0)
+            print(f"[mem] total pss (parent + workers) = {total_pss // 1024}MB", file=sys.stderr)
+
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    main()
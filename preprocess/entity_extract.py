@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List
 from .extractor import Extractor
 
 
@@ -14,6 +14,14 @@ def extract(question: str) -> Dict[str, Any]:
     return _extractor.extract(question)
 
 
+def extract_many(questions: Iterable[str], n_process: int = 1, batch_size: int = 64) -> Iterator[Dict[str, Any]]:
+    """
+    Batched extract(): yields one result per question, in input order.
+    n_process > 1 runs spaCy in worker processes (nlp.pipe).
+    """
+    return _extractor.extract_many(questions, n_process=n_process, batch_size=batch_size)
+
+
 def wikipedia_candidates(entities: List[Dict[str, Any]]) -> List[str]:
     """
     Placeholder: we currently do NOT use real Wikipedia retrieval.
@@ -1,6 +1,5 @@
-import json
 import re
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 
 import spacy
 
@@ -26,8 +25,18 @@ class Extractor:
         self.allowed_role_heads = allowed_role_heads
 
     def extract(self, question: str) -> Dict:
+        return self._from_doc(question, self.nlp(question))
+
+    def extract_many(self, questions: Iterable[str], n_process: int = 1, batch_size: int = 64) -> Iterator[Dict]:
+        """Like extract() over many questions, in input order; spaCy runs batched via nlp.pipe."""
+        texts = list(questions)
+        docs = self.nlp.pipe(texts, n_process=n_process, batch_size=batch_size)
+        for question, doc in zip(texts, docs):
+            yield self._from_doc(question, doc)
+
+    def _from_doc(self, question: str, doc) -> Dict:
         role_entities, countries_in_roles = self._extract_role_entities(question)
-        ner_entities = self._extract_ner(question, countries_in_roles)
+        ner_entities = self._ner_from_doc(doc, countries_in_roles)
         dates = self._extract_dates(question)
 
         entities = self._dedup(role_entities + ner_entities)
@@ -51,7 +60,10 @@ class Extractor:
         return entities, countries_in_roles
 
     def _extract_ner(self, text: str, exclude_countries: Set[str]) -> List[Dict]:
-        doc = self.nlp(text)
+        return self._ner_from_doc(self.nlp(text), exclude_countries)
+
+    @staticmethod
+    def _ner_from_doc(doc, exclude_countries: Set[str]) -> List[Dict]:
         out: List[Dict] = []
 
         for ent in doc.ents:
@@ -96,9 +108,3 @@ class Extractor:
                 seen.add(key)
                 out.append(e)
         return out
-
-
-_extractor = Extractor()
-def load_json(path: str):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
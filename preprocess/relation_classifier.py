@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List
+
+
+# Verb families -> trigger phrases. Families are matched against ICEWS relation
+# names (e.g. "visit" -> "Make a visit", "Host a visit").
+RELATION_SYNONYMS: Dict[str, List[str]] = {
+    "praise": ["praise", "praises", "praised", "praising", "offer praise", "offered praise",
+               "commend", "commends", "commended", "laud", "lauds", "lauded", "hail", "hails", "hailed"],
+    "endorse": ["endorse", "endorses", "endorsed", "endorsing", "endorsement", "back", "backs", "backed",
+                "backing", "support", "supports", "supported", "supporting"],
+    "consult": ["consult", "consults", "consulted", "consulting", "consultation", "consultations"],
+    "appeal": ["appeal", "appeals", "appealed", "appealing", "request", "requests", "requested", "requesting",
+               "call for", "called for", "calls for", "urge", "urges", "urged", "urging"],
+    "threaten": ["threaten", "threatens", "threatened", "threatening", "threat", "threats",
+                 "warn", "warns", "warned", "warning", "warnings"],
+    "reject": ["reject", "rejects", "rejected", "rejecting", "rejection", "deny", "denies", "denied", "denying",
+               "refuse", "refuses", "refused", "refusing"],
+    "visit": ["visit", "visits", "visited", "visiting", "travel", "travels", "traveled", "travelled",
+              "traveling", "travelling", "trip", "trips"],
+    "meet": ["meet", "meets", "met", "meeting", "meetings", "talk", "talks", "talked"],
+    "criticize": ["criticize", "criticizes", "criticized", "criticizing", "criticise", "criticises", "criticised",
+                  "criticising", "criticism", "condemn", "condemns", "condemned", "condemning",
+                  "denounce", "denounces", "denounced", "denouncing"],
+    "negotiate": ["negotiate", "negotiates", "negotiated", "negotiating", "negotiation", "negotiations",
+                  "bargain", "bargained", "bargaining"],
+    "host": ["host", "hosts", "hosted", "hosting"],
+    "aid": ["aid", "aided", "aiding", "assistance", "assist", "assists", "assisted", "assisting"],
+}
+
+
+class RelationClassifier:
+    """
+    Rule-based question -> ICEWS relation family classifier.
+
+    Each trigger is matched as a whole word or phrase, so inflections are listed
+    explicitly ("host" must not hit "hostile"); families are ranked by number of
+    trigger hits.
+    """
+
+    def __init__(self, synonyms: Dict[str, List[str]] | None = None, top_n: int = 3):
+        self.synonyms = synonyms or RELATION_SYNONYMS
+        self.top_n = top_n
+        self._patterns = [
+            (canon, re.compile(r"\b(?:" + "|".join(re.escape(t) for t in triggers) + r")\b"))
+            for canon, triggers in self.synonyms.items()
+        ]
+
+    def predict(self, question: str, top_n: int | None = None) -> List[str]:
+        text = (question or "").lower()
+        scored = []
+        for order, (canon, pattern) in enumerate(self._patterns):
+            hits = len(pattern.findall(text))
+            if hits:
+                scored.append((-hits, order, canon))
+
+        scored.sort()
+        return [canon for _, _, canon in scored[: top_n or self.top_n]]
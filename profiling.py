@@ -0,0 +1,155 @@
+"""
+Opt-in per-stage profiling for TKGQAPipeline.
+
+Each stage (extraction, expansion, retrieve, time_filter, rerank) runs under
+its own cProfile.Profile and between two tracemalloc snapshots; results
+accumulate over all processed questions. dump() writes, per stage:
+
+    <stage>.collapsed   folded stacks ("a;b;c <microseconds>") for flamegraph.pl / speedscope
+    <stage>.prof        raw pstats (snakeviz, pstats.Stats)
+    <stage>.alloc.txt   top-N allocation sites by net bytes
+
+plus summary.txt. cProfile call graphs only record caller->callee edges, so
+time below a function is split across its callees in proportion to their
+cumulative time on that edge. Profiling is per thread: run single-process.
+"""
+import contextlib
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+STAGES = ("extraction", "expansion", "retrieve", "time_filter", "rerank")
+
+_MAX_DEPTH = 64
+_MIN_US = 1.0  # drop stack paths below a microsecond
+_OWN_FILES = {contextlib.__file__, __file__}
+
+
+def _label(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":  # built-ins
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{line})"
+    return label.replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats, root: str) -> Dict[str, float]:
+    """Folded stacks in microseconds, rebuilt from the pstats caller graph."""
+    raw = stats.stats  # func -> (cc, nc, tt, ct, callers)
+    callees: Dict[tuple, Dict[tuple, float]] = defaultdict(dict)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]  # cumulative time on this edge
+
+    folded: Dict[str, float] = defaultdict(float)
+
+    def walk(func, path: List[str], on_path: set, t: float) -> None:
+        _, _, tt, ct, _ = raw[func]
+        label = _label(func)
+        stack = path + [label]
+        if ct <= 0:
+            return
+        own = t * tt / ct
+        if own * 1e6 >= _MIN_US:
+            folded[";".join(stack)] += own * 1e6
+        if len(stack) >= _MAX_DEPTH:
+            return
+        on_path.add(func)
+        for callee, edge_ct in callees.get(func, {}).items():
+            if callee in on_path or callee not in raw:
+                continue  # recursion: the time is already in the callee's own entry
+            child_t = t * edge_ct / ct
+            if child_t * 1e6 >= _MIN_US:
+                walk(callee, stack, on_path, child_t)
+        on_path.discard(func)
+
+    for func, (_, _, _, ct, callers) in raw.items():
+        if callers or func[0] in _OWN_FILES or func[2] == "<method 'disable' of '_lsprof.Profiler' objects>":
+            continue  # not a root, or the profiler's own enter/exit frames
+        walk(func, [root], set(), ct)
+    return folded
+
+
+class StageProfiler:
+    def __init__(self, out_dir: str, top_n: int = 20, alloc_frames: int = 1):
+        self.out_dir = out_dir
+        self.top_n = top_n
+        self.alloc_frames = alloc_frames
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._alloc: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._seconds: Dict[str, float] = defaultdict(float)
+        self._peak: Dict[str, int] = defaultdict(int)
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ]
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        # started lazily so the index built at construction time isn't traced
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.alloc_frames)
+        before = tracemalloc.take_snapshot().filter_traces(self._filters)
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+
+        prof = self._profiles.setdefault(name, cProfile.Profile())
+        t0 = time.perf_counter()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            self._seconds[name] += time.perf_counter() - t0
+            self._calls[name] += 1
+
+            _, peak = tracemalloc.get_traced_memory()
+            self._peak[name] = max(self._peak[name], peak - base)
+            after = tracemalloc.take_snapshot().filter_traces(self._filters)
+            sites = self._alloc[name]
+            for stat in after.compare_to(before, "lineno"):
+                if stat.size_diff or stat.count_diff:
+                    frame = stat.traceback[0]
+                    site = sites[f"{frame.filename}:{frame.lineno}"]
+                    site[0] += stat.size_diff
+                    site[1] += stat.count_diff
+
+    def stats(self, name: str) -> pstats.Stats:
+        return pstats.Stats(self._profiles[name])
+
+    def dump(self) -> str:
+        """Write per-stage collapsed stacks, pstats and allocation sites; returns the summary path."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        summary = [f"{'stage':<12} {'calls':>6} {'seconds':>9} {'net_alloc_kb':>13} {'peak_kb':>9}"]
+
+        for name in sorted(self._profiles, key=lambda n: STAGES.index(n) if n in STAGES else len(STAGES)):
+            st = self.stats(name)
+            st.dump_stats(os.path.join(self.out_dir, f"{name}.prof"))
+
+            with open(os.path.join(self.out_dir, f"{name}.collapsed"), "w", encoding="utf-8") as f:
+                for stack, us in sorted(collapsed_stacks(st, name).items()):
+                    f.write(f"{stack} {int(round(us))}\n")
+
+            sites = sorted(self._alloc[name].items(), key=lambda kv: kv[1][0], reverse=True)
+            with open(os.path.join(self.out_dir, f"{name}.alloc.txt"), "w", encoding="utf-8") as f:
+                f.write(f"{'net_kb':>10} {'blocks':>8}  site\n")
+                for site, (size, count) in sites[: self.top_n]:
+                    f.write(f"{size / 1024:>10.1f} {count:>8}  {site}\n")
+
+            net = sum(size for size, _ in self._alloc[name].values())
+            summary.append(
+                f"{name:<12} {self._calls[name]:>6} {self._seconds[name]:>9.3f} "
+                f"{net / 1024:>13.1f} {self._peak[name] / 1024:>9.1f}"
+            )
+
+        path = os.path.join(self.out_dir, "summary.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(summary) + "\n")
+        return path
@@ -0,0 +1,256 @@
+"""
+Bulk question answering over JSONL, streamed.
+
+Reads one JSON object per line ({"question": ...} or {"question_implicit": ...},
+optional "id") from a file or stdin and writes one result per line to stdout
+(or --out), in input order:
+
+    {"id": ..., "seq": 0, ...TKGQAPipeline.process() result...}
+    {"id": ..., "seq": 1, "error": "..."}           (bad line or failed question)
+
+With --compact each result holds only event_ids / scores / counts
+(pipeline.COMPACT_COUNTS).
+
+A reader thread feeds a bounded queue; worker threads take micro-batches of up
+to --batch_size questions (waiting at most --max_wait seconds to fill one) and
+run them through process_batch(), so extraction goes through nlp.pipe and the
+encoder sees one batch; more --workers extract in parallel. The writer restores
+input order. At most --max_in_flight questions are between reading and writing,
+reorder buffer included, so memory stays flat however long the input is.
+Throughput (and ETA for file input) goes to stderr every --report_every seconds.
+
+    python qa_stream.py --input questions.jsonl --out answers.jsonl --batch_size 32
+    cat questions.jsonl | python qa_stream.py --no_reranker > answers.jsonl
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pipeline import TKGQAPipeline
+
+_EOF = object()
+
+
+def count_lines(path: str, chunk_size: int = 1 << 20) -> int:
+    n = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            n += chunk.count(b"\n")
+            last = chunk[-1:]
+    return n + (last != b"\n")
+
+
+def parse_line(line: str) -> Tuple[Optional[object], Optional[str], Optional[str]]:
+    """(id, question, error) for one input line."""
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        return None, None, f"bad json: {e}"
+    if isinstance(item, str):
+        return None, item, None
+    if not isinstance(item, dict):
+        return None, None, "expected an object or a string"
+    question = item.get("question_implicit") or item.get("question")
+    if not question:
+        return item.get("id"), None, "missing 'question'"
+    return item.get("id"), question, None
+
+
+class StreamRunner:
+    def __init__(self, pipeline: TKGQAPipeline, options: Dict, workers: int = 1, batch_size: int = 16,
+                 max_wait: float = 0.05, max_in_flight: int = 256):
+        self.pipeline = pipeline
+        self.options = options
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._work: "queue.Queue" = queue.Queue(maxsize=max_in_flight)
+        self._done: "queue.Queue" = queue.Queue()
+        self._total: Optional[int] = None  # set by the reader at EOF
+        self.errors = 0
+
+    def _read(self, lines: Iterator[str]) -> None:
+        seq = 0
+        try:
+            for line in lines:
+                if not line.strip():
+                    continue
+                self._slots.acquire()  # backpressure: wait for the writer to catch up
+                qid, question, error = parse_line(line)
+                if error is not None:
+                    self._done.put((seq, {"id": qid, "seq": seq, "error": error}))
+                else:
+                    self._work.put((seq, qid, question))
+                seq += 1
+        except Exception as e:  # unreadable input: report it in place of the rest
+            self._slots.acquire()
+            self._done.put((seq, {"id": None, "seq": seq, "error": f"input error: {e}"}))
+            seq += 1
+        finally:
+            self._total = seq
+            for _ in range(self.workers):
+                self._work.put(_EOF)
+            self._done.put(None)  # wake the writer to see the total
+
+    def _next_batch(self) -> Optional[List[Tuple]]:
+        first = self._work.get()
+        if first is _EOF:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._work.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _EOF:
+                self._work.put(_EOF)  # leave it for this worker's next call
+                break
+            batch.append(item)
+        return batch
+
+    def _answer(self, batch: List[Tuple]) -> List[Dict]:
+        try:
+            results = self.pipeline.process_batch([question for _, _, question in batch], **self.options)
+        except Exception:
+            # isolate the failing question(s)
+            results = []
+            for _, _, question in batch:
+                try:
+                    results.append(self.pipeline.process(question, **self.options))
+                except Exception as e:
+                    results.append({"question": question, "error": f"{type(e).__name__}: {e}"})
+        return [{"id": qid, "seq": seq, **result} for (seq, qid, _), result in zip(batch, results)]
+
+    def _work_loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            for record in self._answer(batch):
+                self._done.put((record["seq"], record))
+
+    def run(self, lines: Iterator[str], out, total_hint: Optional[int] = None, report_every: float = 10.0) -> int:
+        threads = [threading.Thread(target=self._read, args=(lines,), name="qa-reader", daemon=True)]
+        threads += [threading.Thread(target=self._work_loop, name=f"qa-worker-{i}", daemon=True)
+                    for i in range(self.workers)]
+        for t in threads:
+            t.start()
+
+        start = time.monotonic()
+        next_report = start + report_every
+        buffered: Dict[int, Dict] = {}
+        written = 0
+        while self._total is None or written < self._total:
+            try:
+                item = self._done.get(timeout=max(0.0, min(1.0, next_report - time.monotonic())))
+            except queue.Empty:
+                item = None
+            if item is not None:
+                seq, record = item
+                buffered[seq] = record
+                while written in buffered:
+                    record = buffered.pop(written)
+                    self.errors += "error" in record
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    written += 1
+                    self._slots.release()
+
+            now = time.monotonic()
+            if now >= next_report:
+                next_report = now + report_every
+                self._report(written, now - start, total_hint)
+
+        out.flush()
+        self._report(written, time.monotonic() - start, total_hint, final=True)
+        return written
+
+    def _report(self, written: int, elapsed: float, total: Optional[int], final: bool = False) -> None:
+        rate = written / elapsed if elapsed > 0 else 0.0
+        msg = f"[qa_stream] {written} answered, {rate:.1f} q/s, {self.errors} errors"
+        if total and not final:
+            eta = (total - written) / rate if rate > 0 else float("inf")
+            msg += f", {written / total:.1%} of {total}, eta {eta:.0f}s"
+        if final:
+            msg += f", done in {elapsed:.1f}s"
+        print(msg, file=sys.stderr, flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default="-", help="JSONL questions file, '-' for stdin")
+    ap.add_argument("--out", default="-", help="JSONL results file, '-' for stdout")
+    ap.add_argument("--icews", default="icews_2014_train.txt")
+    ap.add_argument("--graph", default="implicit_relation_graph.json")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--workers", type=int, default=1, help="Worker threads, each running whole micro-batches")
+    ap.add_argument("--batch_size", type=int, default=16, help="Questions per micro-batch")
+    ap.add_argument("--max_wait", type=float, default=0.05, help="Seconds to wait for a micro-batch to fill")
+    ap.add_argument("--max_in_flight", type=int, default=256, help="Questions read but not yet written")
+    ap.add_argument("--report_every", type=float, default=10.0, help="Seconds between progress lines on stderr")
+    ap.add_argument("--encoder_top_k", type=int, default=10)
+    ap.add_argument("--rerank_cap", type=int, default=200)
+    ap.add_argument("--no_implicit", action="store_true")
+    ap.add_argument("--no_time_filter", action="store_true")
+    ap.add_argument("--no_reranker", action="store_true")
+    ap.add_argument("--no_relation_prior", action="store_true")
+    ap.add_argument("--restrict_relations", action="store_true")
+    ap.add_argument("--compact", action="store_true", help="Emit event ids/scores/counts instead of full triples")
+    ap.add_argument("--encoder_autotune", action="store_true",
+                    help="Measure encode batching budgets at startup (a few extra encode passes)")
+    ap.add_argument("--embedding_store", default=None,
+                    help="Persistent triple-embedding store; indexed events are encoded into it in the background")
+    args = ap.parse_args()
+
+    options = {
+        "encoder_top_k": args.encoder_top_k,
+        "rerank_cap": args.rerank_cap,
+        "use_implicit": not args.no_implicit,
+        "use_time_filter": not args.no_time_filter,
+        "use_reranker": not args.no_reranker,
+        "use_relation_prior": not args.no_relation_prior,
+        "restrict_relations": args.restrict_relations,
+        "compact": args.compact,
+    }
+
+    t0 = time.perf_counter()
+    pipeline = TKGQAPipeline(
+        implicit_graph_path=args.graph,
+        icews_path=args.icews,
+        encoder_model_name=args.model,
+        device=args.device,
+        encoder_autotune=args.encoder_autotune,
+        embedding_store_path=args.embedding_store,
+    )
+    pipeline.start_embedding_ingest()
+    print(f"[qa_stream] pipeline ready in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    total = count_lines(args.input) if args.input != "-" else None
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        runner = StreamRunner(pipeline, options, workers=args.workers, batch_size=args.batch_size,
+                              max_wait=args.max_wait, max_in_flight=args.max_in_flight)
+        runner.run(src, out, total_hint=total, report_every=args.report_every)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
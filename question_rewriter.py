@@ -113,6 +113,7 @@ class QuestionRewriter:
         ctx = (anchor_phrase or "").lower()
 
         # Small synonym/normalization map to reduce lexical mismatch with ICEWS relations
+        # (kept separate from RELATION_SYNONYMS: triggers here are substring-matched)
         SYN = {
             "praise": ["praise", "praised", "offer praise", "offered praise", "commend", "laud", "hail"],
             "endorse": ["endorse", "endorsed", "back", "support"],
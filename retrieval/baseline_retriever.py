@@ -1,15 +1,160 @@
 
+import heapq
 import json
-from typing import List, Dict, Set
+import re
+from bisect import bisect_left
+from datetime import date
+from typing import Iterable, List, Dict, Set, Tuple
 from collections import defaultdict
 
+from retrieval.candidate import Candidate
+
+
+# ranked mode: per-entity match weights + date proximity + relation prior
+EXACT_WEIGHT = 1.0
+LOWER_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.5
+DATE_WEIGHT = 1.0
+RELATION_BONUS = 0.5
+MENTION_WEIGHT = 0.25  # approaches this as a quadruple's mention count grows
+
+# keys with at least this many events get heavy-hitter summaries at index time
+HEAVY_HITTER_MIN = 2000
+
+# date-only retrieval reorders (relation prior / ranked score) only this many events,
+# a fixed number so that a smaller cap always gets a prefix of a larger cap's list
+DATE_SCAN_LIMIT = 4000
+
+_UNKNOWN_DATE = -1
+
+
+def _date_ordinal(value: str) -> int:
+    try:
+        return date.fromisoformat((value or "")[:10]).toordinal()
+    except ValueError:
+        return _UNKNOWN_DATE
+
+
+def _date_interval(date_info: Dict) -> Tuple[int, int] | None:
+    """Extractor date dict -> inclusive (first_day, last_day) ordinals."""
+    value = date_info.get("date") or ""
+    fmt = date_info.get("format")
+    try:
+        if fmt == "iso":
+            d = date.fromisoformat(value).toordinal()
+            return d, d
+        if fmt == "month_year":
+            year, month = int(value[:4]), int(value[5:7])
+            nxt = date(year + month // 12, month % 12 + 1, 1)
+            return date(year, month, 1).toordinal(), nxt.toordinal() - 1
+        if fmt == "year":
+            year = int(value[:4])
+            return date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+    except ValueError:
+        return None
+    return None
+
+
+def _month_key(ordinal: int) -> int:
+    d = date.fromordinal(ordinal)
+    return d.year * 12 + d.month - 1
+
+
+class _HeavyPostings:
+    """Index-time summaries for one very frequent entity key (all lists hold event ids)."""
+
+    __slots__ = ("by_date", "months", "by_relation", "recent")
+
+    def __init__(self, by_date: List[int], date_ord: List[int], events: List[Dict], recent_n: int):
+        self.by_date = by_date  # sorted by (date, id); shared with the ranked walk
+        self.months: Dict[int, List[int]] = defaultdict(list)
+        self.by_relation: Dict[str, List[int]] = defaultdict(list)  # each sorted by date
+        for idx in by_date:
+            if date_ord[idx] != _UNKNOWN_DATE:
+                self.months[_month_key(date_ord[idx])].append(idx)
+            self.by_relation[events[idx].get("relation")].append(idx)
+        self.months = dict(self.months)
+        self.by_relation = dict(self.by_relation)
+        self.recent = by_date[: -recent_n - 1 : -1] if recent_n else []  # newest first
+
+
+def match_relation_names(relation_names: Iterable[str], keywords: Iterable[str]) -> List[str]:
+    """Relation names containing any keyword as a word prefix ("visit" -> "Make a visit")."""
+    key = sorted({k.lower() for k in keywords if k})
+    if not key:
+        return []
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in key) + r")")
+    return sorted(r for r in relation_names if pattern.search(r.lower()))
+
+
+def collapse_duplicates(events: List[Dict]) -> List[Dict]:
+    """Merge identical (head, relation, tail, date) quadruples into one event with a mention count."""
+    merged: Dict[Tuple, Dict] = {}
+    for event in events:
+        key = (event.get("head"), event.get("relation"), event.get("tail"), event.get("date"))
+        kept = merged.get(key)
+        if kept is None:
+            kept = dict(event)
+            kept["mentions"] = 0
+            merged[key] = kept
+        kept["mentions"] += event.get("mentions", 1)
+    return list(merged.values())
+
+
+def load_events(path: str, dedup: bool = True) -> List[Dict]:
+    """Events in index order (event ids are positions in this list), without building any index."""
+    events: List[Dict] = []
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            events = json.load(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) >= 4:
+                    events.append({
+                        "head": parts[0],
+                        "relation": parts[1],
+                        "tail": parts[2],
+                        "date": parts[3],
+                    })
+    return collapse_duplicates(events) if dedup else events
+
 
 class BaselineRetriever:
-    def __init__(self, events_path: str, cap: int = 1000):
+    def __init__(
+        self,
+        events_path: str,
+        cap: int = 1000,
+        ranked: bool = False,
+        tolerance_days: int = 30,
+        dedup: bool = True,
+        heavy_hitter_min: int = HEAVY_HITTER_MIN,
+        date_index: bool = True,
+    ):
         self.cap = cap
+        self.ranked = ranked
+        self.dedup = dedup
+        self.tolerance_days = max(1, tolerance_days)
+        self.heavy_hitter_min = heavy_hitter_min
         self.events: List[Dict] = []
+        self._date_ord: List[int] = []
+        self._max_mention_bonus = 0.0
         self.entity_index: Dict[str, Set[int]] = defaultdict(set)
         self.entity_index_lc: Dict[str, Set[int]] = defaultdict(set)
+        self.relation_index: Dict[str, Set[int]] = defaultdict(set)
+        self._relation_matches: Dict[tuple, List[str]] = {}
+        # lc key -> event ids sorted by (date, id); built lazily for ranked mode
+        self._sorted_postings: Dict[str, List[int]] = {}
+        # lc key -> month buckets / per-relation postings / newest events, for very frequent keys
+        self.heavy: Dict[str, _HeavyPostings] = {}
+        # date index for questions whose entities don't resolve: day ordinal -> event ids
+        # (most mentioned first), sorted indexed days, and month/year -> (start, end) in _days
+        self.use_date_index = date_index
+        self.day_index: Dict[int, List[int]] = {}
+        self._days: List[int] = []
+        self.month_index: Dict[int, Tuple[int, int]] = {}
+        self.year_index: Dict[int, Tuple[int, int]] = {}
 
         # cache of known entity keys for capped substring fallback
         self._keys: List[str] = []
@@ -18,20 +163,11 @@ class BaselineRetriever:
         self._load_and_index(events_path)
 
     def _load_and_index(self, path: str) -> None:
-        if path.endswith(".json"):
-            with open(path, "r", encoding="utf-8") as f:
-                self.events = json.load(f)
-        else:
-            with open(path, "r", encoding="utf-8") as f:
-                for line in f:
-                    parts = line.rstrip("\n").split("\t")
-                    if len(parts) >= 4:
-                        self.events.append({
-                            "head": parts[0],
-                            "relation": parts[1],
-                            "tail": parts[2],
-                            "date": parts[3],
-                        })
+        self.events = load_events(path, dedup=self.dedup)
+
+        self._date_ord = [_date_ordinal(e.get("date", "")) for e in self.events]
+        max_mentions = max((e.get("mentions", 1) for e in self.events), default=1)
+        self._max_mention_bonus = MENTION_WEIGHT * (1.0 - 1.0 / max_mentions)
 
         for idx, event in enumerate(self.events):
             head = event.get("head")
@@ -45,48 +181,513 @@ class BaselineRetriever:
                 self.entity_index[tail].add(idx)
                 self.entity_index_lc[tail.lower()].add(idx)
 
+            relation = event.get("relation")
+            if relation:
+                self.relation_index[relation].add(idx)
+
         #  materialize key lists once for fallback scanning
         # (use lc index keys; covers both head+tail)
         self._keys_lc = list(self.entity_index_lc.keys())
         # keep original-case keys too (not strictly required, but cheap)
         self._keys = list(self.entity_index.keys())
 
-    def retrieve(self, entities: List[str], cap: int | None = None) -> List[Dict]:
+        if self.heavy_hitter_min:
+            for key_lc, ids in self.entity_index_lc.items():
+                if len(ids) >= self.heavy_hitter_min:
+                    self.heavy[key_lc] = _HeavyPostings(self._postings(key_lc), self._date_ord, self.events, self.cap)
+
+        if self.use_date_index:
+            self._build_date_index()
+
+    def _build_date_index(self) -> None:
+        days: Dict[int, List[int]] = defaultdict(list)
+        for idx, d in enumerate(self._date_ord):
+            if d != _UNKNOWN_DATE:
+                days[d].append(idx)
+        events = self.events
+        for ids in days.values():
+            ids.sort(key=lambda i: (-events[i].get("mentions", 1), i))
+        self.day_index = dict(days)
+        self._days = sorted(days)
+
+        month_index: Dict[int, List[int]] = {}
+        year_index: Dict[int, List[int]] = {}
+        for pos, d in enumerate(self._days):
+            for index, key in ((month_index, _month_key(d)), (year_index, date.fromordinal(d).year)):
+                span = index.setdefault(key, [pos, pos + 1])
+                span[1] = pos + 1
+        self.month_index = {k: tuple(v) for k, v in month_index.items()}
+        self.year_index = {k: tuple(v) for k, v in year_index.items()}
+
+    @property
+    def n_events(self) -> int:
+        """Size of the event id space (ids are 0..n_events-1)."""
+        return len(self.events)
+
+    def get_events(self, ids: Iterable[int]) -> List[Dict]:
+        """Copies of the events with these ids (as in Candidate.event_id), in order, with event_id set."""
+        events = self.events
+        return [dict(events[i], event_id=i) for i in ids]
+
+    def match_relations(self, keywords: Iterable[str]) -> List[str]:
+        """Resolve relation keywords/families ("visit") to indexed ICEWS relation names."""
+        key = tuple(sorted({k.lower() for k in keywords if k}))
+        if not key:
+            return []
+
+        cached = self._relation_matches.get(key)
+        if cached is None:
+            cached = match_relation_names(self.relation_index, key)
+            self._relation_matches[key] = cached
+        return cached
+
+    def retrieve(
+        self,
+        entities: List[str],
+        cap: int | None = None,
+        relations: List[str] | None = None,
+        restrict_relations: bool = False,
+        dates: List[Dict] | None = None,
+        ranked: bool | None = None,
+        allow_fallback: bool = True,
+        date_fallback: bool = True,
+    ) -> List[Candidate]:
+        """
+        allow_fallback=False: exact / lowercase entity lookups only. Otherwise the
+        substring fallback runs when nothing matched and then, with date_fallback,
+        the question's date window (retrieve_by_date).
+        """
         cap = cap or self.cap
+        ranked = self.ranked if ranked is None else ranked
+
+        if ranked:
+            scored = self._retrieve_ranked(
+                entities, cap, relations, restrict_relations, dates, allow_fallback
+            )
+            if not scored and dates and allow_fallback and date_fallback:
+                return self.retrieve_by_date(dates, cap, relations, restrict_relations, ranked=True)
+            return [Candidate(idx, self.events[idx], score) for score, idx in scored]
+
         indices: Set[int] = set()
+        heavy: List[_HeavyPostings] = []
 
         # 1) Exact + lowercase lookup (unchanged behavior)
         for entity in entities:
             if not entity:
                 continue
+            hp = self.heavy.get(entity.lower())
+            if hp is not None:
+                # the lc postings already include the exact-case ones; sliced below
+                if all(hp is not h for h in heavy):
+                    heavy.append(hp)
+                continue
             indices.update(self.entity_index.get(entity, []))
             indices.update(self.entity_index_lc.get(entity.lower(), []))
 
+        if heavy:
+            return self._retrieve_heavy(indices, heavy, cap, relations, restrict_relations, dates)
+
         # 2) new conservative substring fallback ONLY if nothing found
-        if not indices:
-            MAX_KEY_HITS = 200  # cap to prevent explosion
-            key_hits = 0
+        if not indices and allow_fallback:
+            for _, k_lc in self._fuzzy_keys(entities):
+                indices.update(self.entity_index_lc.get(k_lc, []))
+
+        # 2b) still nothing: the question's date window, if it has one
+        if not indices and dates and allow_fallback and date_fallback:
+            return self.retrieve_by_date(dates, cap, relations, restrict_relations, ranked=False)
+
+        ordered = list(indices)
+
+        # 3) relation prior: matching relations go first so the cap keeps them
+        if relations:
+            rel_sets = [self.relation_index[r] for r in relations if r in self.relation_index]
+            preferred = [i for i in ordered if any(i in s for s in rel_sets)]
+            if restrict_relations:
+                ordered = preferred or ordered
+            elif preferred:
+                preferred_set = set(preferred)
+                ordered = preferred + [i for i in ordered if i not in preferred_set]
+
+        return [Candidate(i, self.events[i], 1.0) for i in ordered[:cap]]
+
+    def _retrieve_heavy(
+        self,
+        light: Set[int],
+        heavy: List[_HeavyPostings],
+        cap: int,
+        relations: List[str] | None,
+        restrict_relations: bool,
+        dates: List[Dict] | None,
+    ) -> List[Candidate]:
+        """
+        Unranked retrieval when a query key is a heavy hitter: only the slices needed to
+        fill `cap` are read. Relation-preferred events still go first; within each group,
+        events of the other (light) keys come first, then heavy-key events in months
+        overlapping the query dates (± tolerance), then the rest newest first.
+        """
+        rel_names = [r for r in relations or [] if r in self.relation_index]
+        rel_sets = [self.relation_index[r] for r in rel_names]
+        tol = self.tolerance_days
+        months: Set[int] = set()
+        for lo, hi in (iv for iv in (_date_interval(d) for d in (dates or [])) if iv):
+            months.update(range(_month_key(max(1, lo - tol)), _month_key(hi + tol) + 1))
+        months_desc = sorted(months, reverse=True)
+        date_ord = self._date_ord
+
+        def preferred(idx: int) -> bool:
+            return any(idx in rs for rs in rel_sets)
 
-            for entity in entities:
-                if not entity:
+        def heavy_stream(want_preferred: bool | None):
+            # want_preferred: True / False select one relation group, None takes both
+            for hp in heavy:
+                for m in months_desc:
+                    for idx in reversed(hp.months.get(m, ())):
+                        if want_preferred is None or preferred(idx) == want_preferred:
+                            yield idx
+            for hp in heavy:
+                if want_preferred:
+                    yield from heapq.merge(
+                        *[reversed(hp.by_relation[r]) for r in rel_names if r in hp.by_relation],
+                        key=lambda i: -date_ord[i],
+                    )
                     continue
-                e = entity.strip().lower()
-                if len(e) < 4:
+                if want_preferred is None:
+                    yield from hp.recent
+                    stop = len(hp.by_date) - len(hp.recent)
+                else:
+                    stop = len(hp.by_date)
+                for pos in range(stop - 1, -1, -1):
+                    idx = hp.by_date[pos]
+                    if want_preferred is None or not preferred(idx):
+                        yield idx
+
+        out: List[int] = []
+        seen: Set[int] = set()
+
+        def take(ids: Iterable[int]) -> bool:
+            for idx in ids:
+                if idx not in seen:
+                    seen.add(idx)
+                    out.append(idx)
+                    if len(out) >= cap:
+                        return True
+            return False
+
+        ordered = list(light)
+        if rel_sets:
+            groups = [
+                ([i for i in ordered if preferred(i)], heavy_stream(True)),
+                ([i for i in ordered if not preferred(i)], heavy_stream(False)),
+            ]
+        else:
+            groups = [(ordered, heavy_stream(None))]
+
+        for n, (light_ids, heavy_ids) in enumerate(groups):
+            if n and restrict_relations and out:
+                break  # restricted: non-preferred events only when nothing is preferred
+            if take(light_ids) or take(heavy_ids):
+                break
+
+        return [Candidate(i, self.events[i], 1.0) for i in out]
+
+    def _date_window_days(self, dates: List[Dict]) -> List[Tuple[int, int]]:
+        """(distance, day) for indexed days matching the query dates, nearest first."""
+        best: Dict[int, int] = {}
+        tol = self.tolerance_days
+        for date_info in dates:
+            iv = _date_interval(date_info)
+            if iv is None:
+                continue
+            lo, hi = iv
+            fmt = date_info.get("format")
+            if fmt == "iso":
+                # day bucket ± tolerance, as TimeFilter keeps
+                start, end = bisect_left(self._days, lo - tol), bisect_left(self._days, hi + tol + 1)
+            else:
+                # month/year rollup: TimeFilter keeps the whole period, nothing around it
+                if fmt == "month_year":
+                    span = self.month_index.get(_month_key(lo))
+                else:
+                    span = self.year_index.get(date.fromordinal(lo).year)
+                if span is None:
                     continue
+                start, end = span
+            for d in self._days[start:end]:
+                dist = lo - d if d < lo else (d - hi if d > hi else 0)
+                if dist < best.get(d, dist + 1):
+                    best[d] = dist
+        return sorted((dist, d) for d, dist in best.items())
 
-                # Scan keys (lowercased). Stop early when enough hits.
-                for k_lc in self._keys_lc:
-                    if e in k_lc or k_lc in e:
-                        indices.update(self.entity_index_lc.get(k_lc, []))
-                        key_hits += 1
-                        if key_hits >= MAX_KEY_HITS:
+    def retrieve_by_date(
+        self,
+        dates: List[Dict],
+        cap: int | None = None,
+        relations: List[str] | None = None,
+        restrict_relations: bool = False,
+        ranked: bool | None = None,
+    ) -> List[Candidate]:
+        """
+        Candidates from the date index alone (no query entity resolved). Nearer days
+        come first; days at the same distance (e.g. a whole month) are interleaved, most
+        mentioned events first. Within the first DATE_SCAN_LIMIT events relation-preferred
+        ones go first as in entity retrieval (ranked: sorted by the entity-free score);
+        any further events up to cap follow in scan order. Neither step depends on
+        cap, so a smaller cap gets a prefix of a larger one.
+        """
+        if not self.use_date_index:
+            return []
+        cap = cap or self.cap
+        ranked = self.ranked if ranked is None else ranked
+        rel_sets = [self.relation_index[r] for r in relations or [] if r in self.relation_index]
+        reorder = bool(rel_sets) or ranked
+        limit = max(cap, DATE_SCAN_LIMIT) if reorder else cap
+
+        pool: List[Tuple[int, int]] = []  # (distance, idx)
+        layer: List[int] = []
+        layer_dist = None
+        window = self._date_window_days(dates)
+        for dist, day in window + [(None, None)]:
+            if dist != layer_dist and layer:
+                # interleave the days of one distance layer by rank
+                buckets = [self.day_index[d] for d in layer]
+                rank = 0
+                while len(pool) < limit and buckets:
+                    buckets = [b for b in buckets if rank < len(b)]
+                    for b in buckets:
+                        pool.append((layer_dist, b[rank]))
+                        if len(pool) >= limit:
                             break
-                if key_hits >= MAX_KEY_HITS:
-                    break
+                    rank += 1
+                layer = []
+            if dist is None or len(pool) >= limit:
+                break
+            layer_dist = dist
+            layer.append(day)
+
+        pool, tail = pool[:DATE_SCAN_LIMIT], pool[DATE_SCAN_LIMIT:]
+        if rel_sets:
+            preferred = [p for p in pool if any(p[1] in rs for rs in rel_sets)]
+            if restrict_relations:
+                pool, tail = (preferred, []) if preferred else (pool, tail)
+            else:
+                preferred_ids = {i for _, i in preferred}
+                pool = preferred + [p for p in pool if p[1] not in preferred_ids]
+
+        if not ranked:
+            return [Candidate(i, self.events[i], 1.0) for _, i in (pool + tail)[:cap]]
+
+        # ranked: the entity-free part of the ranked score
+        tol = float(self.tolerance_days)
+        scored = []
+        for dist, i in pool + tail:
+            s = DATE_WEIGHT / (1.0 + dist / tol)
+            if any(i in rs for rs in rel_sets):
+                s += RELATION_BONUS
+            mentions = self.events[i].get("mentions", 1)
+            if mentions > 1:
+                s += MENTION_WEIGHT * (1.0 - 1.0 / mentions)
+            scored.append((s, i))
+        head = scored[:len(pool)]
+        head.sort(key=lambda x: -x[0])  # stable: ties keep date order
+        return [Candidate(i, self.events[i], s) for s, i in (head + scored[len(pool):])[:cap]]
+
+    def _fuzzy_keys(self, entities: List[str]) -> List[Tuple[str, str]]:
+        """Substring matches between query entities and index keys, as (entity, lc_key)."""
+        MAX_KEY_HITS = 200  # cap to prevent explosion
+        hits: List[Tuple[str, str]] = []
+
+        for entity in entities:
+            if not entity:
+                continue
+            e = entity.strip().lower()
+            if len(e) < 4:
+                continue
+
+            # Scan keys (lowercased). Stop early when enough hits.
+            for k_lc in self._keys_lc:
+                if e in k_lc or k_lc in e:
+                    hits.append((entity, k_lc))
+                    if len(hits) >= MAX_KEY_HITS:
+                        return hits
+        return hits
+
+    def _postings(self, key_lc: str) -> List[int]:
+        postings = self._sorted_postings.get(key_lc)
+        if postings is None:
+            date_ord = self._date_ord
+            postings = sorted(self.entity_index_lc.get(key_lc, ()), key=lambda i: (date_ord[i], i))
+            self._sorted_postings[key_lc] = postings
+        return postings
+
+    def _retrieve_ranked(
+        self,
+        entities: List[str],
+        cap: int,
+        relations: List[str] | None,
+        restrict_relations: bool,
+        dates: List[Dict] | None,
+        allow_fallback: bool = True,
+    ) -> List[Tuple[float, int]]:
+        """
+        Heap-based top-`cap` over date-sorted posting lists.
+
+        score = sum over query entities of the best match weight
+                (exact > lowercase > fuzzy) + date proximity + relation bonus
+                + mention bonus (collapsed duplicate quadruples).
+
+        Events hit by 2+ query entities are scored up front from the smaller lists.
+        All others match a single entity, so the remaining lists are walked outward
+        from the query dates and the walk stops once nothing unseen can beat the heap.
+        """
+        # per query entity: [(weight, member set)] best first, plus lc keys to walk
+        sources: List[Tuple[List[Tuple[float, Set[int]]], List[str]]] = []
+        seen_keys: Set[str] = set()
+        for entity in entities:
+            if not entity or entity.lower() in seen_keys:
+                continue
+            lc = entity.lower()
+            if lc not in self.entity_index_lc:
+                continue
+            seen_keys.add(lc)
+            members = []
+            if entity in self.entity_index:
+                members.append((EXACT_WEIGHT, self.entity_index[entity]))
+            members.append((LOWER_WEIGHT, self.entity_index_lc[lc]))
+            sources.append((members, [lc]))
+
+        if not sources and allow_fallback:
+            by_entity: Dict[str, List[str]] = defaultdict(list)
+            for entity, k_lc in self._fuzzy_keys(entities):
+                by_entity[entity.lower()].append(k_lc)
+            for keys in by_entity.values():
+                members = [(FUZZY_WEIGHT, self.entity_index_lc[k]) for k in keys]
+                sources.append((members, keys))
+
+        if not sources:
+            return []
+
+        rel_sets = [self.relation_index[r] for r in (relations or []) if r in self.relation_index]
+        intervals = [iv for iv in (_date_interval(d) for d in (dates or [])) if iv]
+        date_ord = self._date_ord
+        tol = float(self.tolerance_days)
+
+        def distance(idx: int) -> int:
+            d = date_ord[idx]
+            best = None
+            for lo, hi in intervals:
+                gap = lo - d if d < lo else (d - hi if d > hi else 0)
+                if best is None or gap < best:
+                    best = gap
+            return best or 0
+
+        def proximity(dist: int) -> float:
+            return DATE_WEIGHT / (1.0 + dist / tol) if intervals else 0.0
+
+        events = self.events
+
+        def score(idx: int) -> float | None:
+            has_rel = any(idx in rs for rs in rel_sets)
+            if restrict_relations and rel_sets and not has_rel:
+                return None
+            total = proximity(distance(idx)) + (RELATION_BONUS if has_rel else 0.0)
+            mentions = events[idx].get("mentions", 1)
+            if mentions > 1:
+                total += MENTION_WEIGHT * (1.0 - 1.0 / mentions)
+            for members, _ in sources:
+                for weight, member_set in members:
+                    if idx in member_set:
+                        total += weight
+                        break
+            return total
+
+        top: List[Tuple[float, int, int]] = []  # min-heap of (score, -seq, idx)
+        seen: Set[int] = set()
+        seq = 0
+
+        def offer(idx: int) -> None:
+            nonlocal seq
+            seen.add(idx)
+            s = score(idx)
+            seq += 1
+            if s is None:
+                return
+            item = (s, -seq, idx)
+            if len(top) < cap:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+
+        # 1) events matching several query entities: probe from all but the largest source
+        if len(sources) > 1:
+            sizes = [sum(len(self.entity_index_lc[k]) for k in keys) for _, keys in sources]
+            largest = max(range(len(sources)), key=lambda i: sizes[i])
+            for i, (_, keys) in enumerate(sources):
+                if i == largest:
+                    continue
+                others = [members for j, (members, _) in enumerate(sources) if j != i]
+                for key in keys:
+                    for idx in self._postings(key):
+                        if idx in seen:
+                            continue
+                        if any(idx in m for members in others for _, m in members):
+                            offer(idx)
+
+        # 2) single-entity events: walk posting lists by increasing date distance
+        frontier = []  # (dist, list_no, step, pos)
+        lists = []
+        for members, keys in sources:
+            for key in keys:
+                hp = self.heavy.get(key)
+                if hp is not None and restrict_relations and rel_sets:
+                    # only events with a preferred relation can score: walk those sub-postings
+                    walks = [hp.by_relation[r] for r in relations if r in hp.by_relation]
+                else:
+                    walks = [self._postings(key)]
+                for postings in walks:
+                    if not postings:
+                        continue
+                    n = len(lists)
+                    lists.append((postings, members[0][0]))
+                    if intervals:
+                        for lo, _ in intervals:
+                            pos = bisect_left(postings, lo, key=lambda i: date_ord[i])
+                            if pos < len(postings):
+                                frontier.append((distance(postings[pos]), n, 1, pos))
+                            if pos > 0:
+                                frontier.append((distance(postings[pos - 1]), n, -1, pos - 1))
+                    else:
+                        # no dates: most recent first
+                        frontier.append((0, n, -1, len(postings) - 1))
+        heapq.heapify(frontier)
+
+        active = defaultdict(int)
+        for _, n, _, _ in frontier:
+            active[n] += 1
+        max_weight = max((lists[n][1] for n in active), default=0.0)
+        bonus_max = (RELATION_BONUS if rel_sets else 0.0) + self._max_mention_bonus
+
+        while frontier:
+            dist, n, step, pos = frontier[0]
+            bound = max_weight + proximity(dist) + bonus_max
+            if len(top) >= cap and top[0][0] >= bound:
+                break
+
+            heapq.heappop(frontier)
+            postings = lists[n][0]
+            idx = postings[pos]
+            if idx not in seen:
+                offer(idx)
 
-        candidates = [self.events[i] for i in indices][:cap]
+            pos += step
+            if 0 <= pos < len(postings):
+                heapq.heappush(frontier, (distance(postings[pos]), n, step, pos))
+            else:
+                active[n] -= 1
+                if not active[n]:
+                    del active[n]
+                    max_weight = max((lists[m][1] for m in active), default=0.0)
 
-        for c in candidates:
-            c["score"] = 1.0
+        if not top and restrict_relations and rel_sets:
+            return self._retrieve_ranked(entities, cap, relations, False, dates, allow_fallback)
 
-        return candidates
+        return [(s, idx) for s, _, idx in sorted(top, reverse=True)]
@@ -0,0 +1,167 @@
+"""
+In-process caches.
+
+LRUCache is a thread-safe LRU with entry and byte limits and an optional TTL.
+SimHasher buckets question embeddings for the pipeline's rerank cache.
+QuestionEmbeddingCache keys question embeddings by (model name, normalized
+question) so repeated / templated questions and ablation passes over the same
+dev set skip the encoder; it can persist to disk between runs.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof or (lambda value: 0)
+
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()  # key -> (value, bytes, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl_seconds is not None and time.monotonic() - item[2] > self.ttl_seconds:
+                self._remove(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def items(self):
+        with self._lock:
+            return [(k, v[0]) for k, v in self._data.items()]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class SimHasher:
+    """
+    Random-hyperplane LSH of a normalized embedding: the sign pattern of `bits`
+    fixed projections. Embeddings at a small angle usually share a bucket.
+    """
+
+    def __init__(self, bits: int = 8, seed: int = 0):
+        self.bits = bits
+        self.seed = seed
+        self._planes = None
+
+    def __call__(self, emb) -> int:
+        import torch
+
+        emb = emb.reshape(-1).float().cpu()
+        if self._planes is None or self._planes.shape[1] != emb.shape[0]:
+            gen = torch.Generator().manual_seed(self.seed)
+            self._planes = torch.randn(self.bits, emb.shape[0], generator=gen)
+        bucket = 0
+        for bit in (self._planes @ emb > 0).tolist():
+            bucket = (bucket << 1) | bit
+        return bucket
+
+
+def normalize_question(text: str, lowercase: bool = False) -> str:
+    # case-fold only for models whose tokenizer lowercases anyway (e.g. bge);
+    # for cased models "US" and "us" are different questions
+    text = " ".join((text or "").split())
+    return text.lower() if lowercase else text
+
+
+def _tensor_bytes(t) -> int:
+    return t.element_size() * t.nelement()
+
+
+class QuestionEmbeddingCache(LRUCache):
+    def __init__(self, max_entries: int = 10_000, max_bytes: Optional[int] = 256 * 1024 * 1024,
+                 persist_path: Optional[str] = None):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes, sizeof=_tensor_bytes)
+        self.persist_path = persist_path
+        self._encode_seconds = 0.0
+        self._encodes = 0
+        if persist_path and os.path.exists(persist_path):
+            self.load(persist_path)
+
+    @staticmethod
+    def key(model_name: str, question: str, lowercase: bool = False) -> Tuple[str, str]:
+        return model_name, normalize_question(question, lowercase)
+
+    def record_encode(self, seconds: float) -> None:
+        """Time spent encoding one missed question (used to estimate time saved by hits)."""
+        self._encode_seconds += seconds
+        self._encodes += 1
+
+    def stats(self) -> Dict[str, float]:
+        out = super().stats()
+        avg = self._encode_seconds / self._encodes if self._encodes else 0.0
+        out["avg_encode_ms"] = avg * 1000.0
+        out["saved_seconds"] = self.hits * avg
+        return out
+
+    def save(self, path: Optional[str] = None) -> None:
+        import torch
+
+        path = path or self.persist_path
+        if not path:
+            return
+        tmp = f"{path}.tmp"
+        torch.save([(k, v.cpu()) for k, v in self.items()], tmp)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> None:
+        import torch
+
+        for key, emb in torch.load(path, map_location="cpu"):
+            self.put(tuple(key), emb)
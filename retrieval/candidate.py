@@ -0,0 +1,64 @@
+from typing import Any, Dict, Optional
+
+
+class Candidate:
+    """
+    Per-request view of an indexed event.
+
+    The event dict is shared with the retriever and never written to; scores
+    live on the view, so concurrent requests can't clobber each other.
+    Dict-style access (c["head"], c.get("date"), c["score"] = ...) keeps the
+    TimeFilter / reranker code working on views and plain dicts alike.
+    """
+
+    __slots__ = ("event_id", "event", "score", "retriever_score")
+
+    def __init__(self, event_id: int, event: Dict[str, Any], score: float = 0.0,
+                 retriever_score: Optional[float] = None):
+        self.event_id = event_id
+        self.event = event
+        self.score = score
+        self.retriever_score = retriever_score
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "score":
+            return self.score
+        if key == "retriever_score":
+            if self.retriever_score is None:
+                raise KeyError(key)
+            return self.retriever_score
+        if key == "event_id":
+            return self.event_id
+        return self.event[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "score":
+            self.score = value
+        elif key == "retriever_score":
+            self.retriever_score = value
+        else:
+            raise KeyError(f"{key!r} is read-only on a candidate view")
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = dict(self.event)
+        out["event_id"] = self.event_id
+        out["score"] = self.score
+        if self.retriever_score is not None:
+            out["retriever_score"] = self.retriever_score
+        return out
+
+    def __repr__(self) -> str:
+        return f"Candidate({self.event_id}, {self.event!r}, score={self.score!r})"
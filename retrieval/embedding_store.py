@@ -0,0 +1,320 @@
+"""
+Persistent triple embeddings for EncoderReranker.
+
+EmbeddingStore is an append-only directory per encoder model:
+
+    meta.json      {"model": ..., "dim": ...}
+    vectors.f32    float32 rows, normalized, memory-mapped for reads
+    keys.bin       16-byte blake2b digest of each row's triple text, same order
+    lock           flock()ed exclusively around every append
+
+Rows are only ever appended (vectors first, then keys), so readers never see a
+row change. Several processes may share a store (e.g. a server and
+scripts/ingest_embeddings.py): under the lock a writer first picks up rows
+other processes appended, cuts a torn append back to the last complete row,
+and takes its row ids from the file size. Readers pick up other writers' rows
+when keys.bin grows.
+
+EmbeddingIndexer is the background writer: ingest(triples) queues a corpus
+(e.g. a new ICEWS drop) and a worker thread encodes the triples not yet stored
+in batches; vectors the reranker had to encode inline are appended too.
+backlog / coverage gauges say how far behind the store is. The worker thread
+is per process: start ingestion after forking (a forked child gets a fresh
+worker for its inline vectors, without the parent's ingest queue).
+"""
+import fcntl
+import hashlib
+import json
+import os
+import queue
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+_KEY_BYTES = 16
+_STOP = object()
+
+
+_STORES: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def _reset_locks_after_fork() -> None:
+    # a lock held by a parent thread at fork time would never be released in the child
+    for store in list(_STORES):
+        store._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=_KEY_BYTES).digest()
+
+
+class EmbeddingStore:
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.model_name = model_name
+        self.dim: Optional[int] = None
+        self._index: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        _STORES.add(self)
+        self._key_bytes = 0  # size of keys.bin this process has indexed
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, "meta.json")
+        self._vec_path = os.path.join(path, "vectors.f32")
+        self._key_path = os.path.join(path, "keys.bin")
+        self._lock_path = os.path.join(path, "lock")
+        if os.path.exists(self._meta_path):
+            self._read_meta()
+            with self._lock, self._file_lock():
+                self._catch_up(repair=True)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock across processes sharing the directory."""
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> None:
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["model"] != self.model_name:
+            raise ValueError(f"embedding store {self.path} holds {meta['model']}, not {self.model_name}")
+        self.dim = meta["dim"]
+
+    def _complete_rows(self) -> int:
+        """Rows with both their vector and key on disk."""
+        return min(os.path.getsize(self._vec_path) // (4 * self.dim),
+                   os.path.getsize(self._key_path) // _KEY_BYTES)
+
+    def _catch_up(self, repair: bool = False) -> None:
+        """
+        Index rows appended since this process last looked (by any process).
+        repair (file lock held): also cut a torn append back to the last complete row.
+        """
+        n = self._complete_rows()
+        if repair:
+            os.truncate(self._vec_path, n * 4 * self.dim)
+            os.truncate(self._key_path, n * _KEY_BYTES)
+        known = len(self._index)
+        if n <= known:
+            return
+        with open(self._key_path, "rb") as f:
+            f.seek(known * _KEY_BYTES)
+            keys = f.read((n - known) * _KEY_BYTES)
+        for j in range(n - known):
+            self._index[keys[j * _KEY_BYTES:(j + 1) * _KEY_BYTES]] = known + j
+        self._key_bytes = n * _KEY_BYTES
+        self._remap(n)
+
+    def _refresh(self) -> None:
+        # cheap check for rows another process appended
+        if self.dim is not None and os.path.getsize(self._key_path) != self._key_bytes:
+            with self._lock:
+                self._catch_up()
+
+    def _remap(self, n: int) -> None:
+        self._vectors = np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(n, self.dim)) if n else None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, text: str) -> bool:
+        return text_key(text) in self._index
+
+    def lookup(self, texts: Sequence[str]) -> List[Optional[int]]:
+        """Row of each text, None if not stored."""
+        keys = [text_key(t) for t in texts]
+        self._refresh()
+        with self._lock:
+            rows = [self._index.get(k) for k in keys]
+        found = sum(r is not None for r in rows)
+        self.hits += found
+        self.misses += len(rows) - found
+        return rows
+
+    def missing(self, texts: Iterable[str]) -> List[str]:
+        """Texts without a stored vector (deduplicated, in order)."""
+        out, seen = [], set()
+        self._refresh()
+        with self._lock:
+            index = self._index
+            for text in texts:
+                key = text_key(text)
+                if key not in index and key not in seen:
+                    seen.add(key)
+                    out.append(text)
+        return out
+
+    def vectors(self, rows: Sequence[int]) -> np.ndarray:
+        """(len(rows), dim) float32 copy of the stored rows."""
+        with self._lock:
+            vectors = self._vectors
+        return np.asarray(vectors[np.asarray(rows, dtype=np.int64)])
+
+    def append(self, texts: Sequence[str], embs: np.ndarray) -> int:
+        """Store vectors for texts not stored yet; returns the number of rows added."""
+        embs = np.ascontiguousarray(embs, dtype=np.float32)
+        with self._lock, self._file_lock():
+            if self.dim is None:
+                if os.path.exists(self._meta_path):  # another process created the store
+                    self._read_meta()
+                else:
+                    self.dim = int(embs.shape[1])
+                    tmp = f"{self._meta_path}.tmp"
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump({"model": self.model_name, "dim": self.dim}, f)
+                    open(self._vec_path, "ab").close()
+                    open(self._key_path, "ab").close()
+                    os.replace(tmp, self._meta_path)
+            if embs.shape[1] != self.dim:
+                raise ValueError(f"expected {self.dim}-dim embeddings, got {embs.shape[1]}")
+            # rows other processes appended, so they aren't stored twice and
+            # this append's row ids start at the file's end
+            self._catch_up(repair=True)
+
+            new_keys, new_rows, seen = [], [], set()
+            for i, text in enumerate(texts):
+                key = text_key(text)
+                if key not in self._index and key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_rows.append(i)
+            if not new_keys:
+                return 0
+
+            with open(self._vec_path, "ab") as f:
+                f.write(embs[new_rows].tobytes())
+            with open(self._key_path, "ab") as f:
+                f.write(b"".join(new_keys))
+
+            n = len(self._index)
+            for j, key in enumerate(new_keys):
+                self._index[key] = n + j
+            self._key_bytes = (n + len(new_keys)) * _KEY_BYTES
+            self._remap(n + len(new_keys))
+            return len(new_keys)
+
+
+class EmbeddingIndexer:
+    def __init__(self, store: EmbeddingStore, encode: Callable[[List[str]], np.ndarray],
+                 text_of: Callable[[Dict], str], batch_size: int = 256):
+        self.store = store
+        self.encode = encode  # texts -> (n, dim) normalized float32 array
+        self.text_of = text_of
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None  # process the worker thread runs in
+        self._start_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._pending = 0  # texts found missing and not yet encoded
+        self._unscanned = 0  # triples queued but not yet checked against the store
+        self.corpus_size = 0
+        self.encoded = 0
+        self.inline_stored = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def ingest(self, triples: Sequence[Dict]) -> None:
+        """Queue a corpus; triples whose text isn't stored yet get encoded in the background."""
+        self._submit(("ingest", triples), corpus=len(triples))
+
+    def add_encoded(self, texts: List[str], embs: np.ndarray) -> None:
+        """Vectors encoded inline at query time; appended by the worker."""
+        self._submit(("encoded", texts, embs))
+
+    def _submit(self, item, corpus: Optional[int] = None) -> None:
+        if self._thread is None or self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    # forked: the parent's worker (and what it had queued) didn't come along
+                    self._queue = queue.Queue()
+                    self._thread = None
+                    with self._count_lock:
+                        self._pending = self._unscanned = 0
+                if self._thread is None:
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="embedding-indexer", daemon=True)
+                    self._thread.start()
+        if corpus is not None:
+            with self._count_lock:
+                self.corpus_size = corpus
+                self._unscanned += corpus
+        self._queue.put(item)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            try:
+                if item[0] == "encoded":
+                    self.inline_stored += self.store.append(item[1], item[2])
+                else:
+                    self._ingest(item[1])
+            except Exception as e:
+                # keep the worker alive; what wasn't stored is encoded inline when needed
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    def _ingest(self, triples: Sequence[Dict]) -> None:
+        texts: List[str] = []
+        try:
+            texts = self.store.missing(self.text_of(t) for t in triples)
+        finally:
+            # count them as pending before they stop counting as unscanned, so backlog never dips
+            with self._count_lock:
+                self._pending += len(texts)
+                self._unscanned -= len(triples)
+        done = 0
+        try:
+            for start in range(0, len(texts), self.batch_size):
+                batch = texts[start:start + self.batch_size]
+                self.store.append(batch, self.encode(batch))
+                done += len(batch)
+                self.encoded += len(batch)
+                with self._count_lock:
+                    self._pending -= len(batch)
+        finally:
+            with self._count_lock:
+                self._pending -= len(texts) - done
+
+    def close(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def backlog(self) -> int:
+        """Triples queued for the background encoder and not stored yet (upper bound while scanning)."""
+        with self._count_lock:
+            return self._pending + self._unscanned
+
+    def stats(self) -> Dict:
+        store = self.store
+        lookups = store.hits + store.misses
+        return {
+            "stored": len(store),
+            "backlog": self.backlog,
+            # share of the last ingested corpus with a stored vector
+            "coverage": 1.0 - min(self.backlog, self.corpus_size) / self.corpus_size if self.corpus_size else 0.0,
+            "encoded": self.encoded,
+            "inline_stored": self.inline_stored,
+            "query_hit_rate": store.hits / lookups if lookups else 0.0,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
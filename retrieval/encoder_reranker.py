@@ -1,37 +1,179 @@
 
+import time
 import torch
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Tuple
 from sentence_transformers import SentenceTransformer
 
+from retrieval.cache import QuestionEmbeddingCache
+from retrieval.embedding_store import EmbeddingIndexer, EmbeddingStore
+from retrieval.encoding_engine import EncodingEngine
+
 
 class EncoderReranker:
-    def __init__(self, model_name: str, device: Optional[str] = None):
+    def __init__(
+        self,
+        model_name: str,
+        device: Optional[str] = None,
+        adaptive_batching: bool = True,
+        question_cache: Optional[QuestionEmbeddingCache] = None,
+        embedding_store: Optional[EmbeddingStore] = None,
+    ):
+        self.model_name = model_name
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.model = SentenceTransformer(model_name, device=self.device)
+        self.question_cache = question_cache
+        # the question cache may case-fold its keys only if the tokenizer does
+        self._uncased = bool(getattr(self.model.tokenizer, "do_lower_case", False))
+        # length-bucketed, token-budgeted batches for candidate texts
+        self.engine = EncodingEngine(self.model) if adaptive_batching else None
+        # stored triple vectors; the indexer fills the store in the background
+        self.embedding_store = embedding_store
+        self.indexer = None
+        if embedding_store is not None:
+            self.indexer = EmbeddingIndexer(
+                embedding_store, lambda texts: self.encode_texts(texts).cpu().numpy(), self._triple_to_text
+            )
+
+    def autotune(self, triples: Sequence[Dict]) -> Optional[int]:
+        """Pick the engine's token budget from measured throughput on sample triples."""
+        if self.engine is None or not triples:
+            return None
+        return self.engine.autotune([self._triple_to_text(t) for t in triples])
+
+    def rerank(self, question: str, triples: List[Dict], top_k: int = 10,
+               question_emb: Optional[torch.Tensor] = None) -> List[Dict]:
+        """
+        Score triples against the question and return the top_k by score.
+        Scores are written onto the given items, so pass per-request
+        Candidate views (what BaselineRetriever returns), not shared event dicts.
+        question_emb is the (1, dim) encode_question() output if the caller has it.
+        """
+        return self.rerank_many([(question, triples)], top_k=top_k, question_embs=question_emb)[0]
+
+    def rerank_many(self, batch: Sequence[Tuple[str, List[Dict]]], top_k: int = 10,
+                    question_embs: Optional[torch.Tensor] = None) -> List[List[Dict]]:
+        """rerank() for several (question, triples) pairs with one encoder pass over their candidates."""
+        out: List[List[Dict]] = []
+        todo = []
+        for i, (_, triples) in enumerate(batch):
+            out.append(triples)  # top_k or fewer: returned as given, unscored
+            if len(triples) > top_k:
+                todo.append(i)
+
+        if question_embs is not None:
+            question_embs = question_embs[todo]
+        all_scores = self.score_many([batch[i] for i in todo], question_embs)
+        for i, scores in zip(todo, all_scores):
+            triples = out[i]
+            for triple, score in zip(triples, scores):
+                triple["retriever_score"] = triple.get("score", 0.0)
+                triple["score"] = float(score)
+            out[i] = sorted(triples, key=lambda x: x["score"], reverse=True)[:top_k]
+        return out
+
+    def score(self, question: str, triples: Sequence[Dict]) -> List[float]:
+        """Cosine similarity of each triple to the question; doesn't modify the triples."""
+        return self.score_many([(question, triples)])[0]
+
+    def score_many(self, batch: Sequence[Tuple[str, Sequence[Dict]]],
+                   question_embs: Optional[torch.Tensor] = None) -> List[List[float]]:
+        """
+        score() per (question, triples) pair; texts shared across pairs are encoded once.
+        question_embs: (len(batch), dim) question embeddings already at hand.
+        """
+        text_ids: Dict[str, int] = {}
+        rows = []
+        for _, triples in batch:
+            rows.append([text_ids.setdefault(self._triple_to_text(t), len(text_ids)) for t in triples])
+        if not text_ids:
+            return [[] for _ in batch]
+
+        texts = list(text_ids)
+        q_emb = question_embs
+        if q_emb is None:
+            q_emb = self.encode_questions([question for question, _ in batch])
+        t_emb = self._text_embeddings(texts)
+
+        out = []
+        for i, ids in enumerate(rows):
+            if not ids:
+                out.append([])
+                continue
+            cand = t_emb[torch.tensor(ids, device=t_emb.device)]
+            out.append(torch.mm(q_emb[i : i + 1], cand.T).squeeze(0).cpu().tolist())
+        return out
+
+    def encode_texts(self, texts: Sequence[str]) -> torch.Tensor:
+        """(n, dim) normalized embeddings of triple texts."""
+        if self.engine is not None:
+            return self.engine.encode(texts, normalize_embeddings=True)
+        return self.model.encode(list(texts), convert_to_tensor=True, normalize_embeddings=True)
+
+    def _text_embeddings(self, texts: List[str]) -> torch.Tensor:
+        """Stored vectors where the embedding store has them; only the rest is encoded here."""
+        store = self.embedding_store
+        if store is None:
+            return self.encode_texts(texts)
+
+        rows = store.lookup(texts)
+        stored = [i for i, r in enumerate(rows) if r is not None]
+        missing = [i for i, r in enumerate(rows) if r is None]
+        if not stored:
+            t_emb = self.encode_texts(texts)
+            self.indexer.add_encoded(texts, t_emb.cpu().numpy())
+            return t_emb
 
-    def rerank(self, question: str, triples: List[Dict], top_k: int = 10) -> List[Dict]:
-        if not triples:
-            return []
+        vecs = torch.from_numpy(store.vectors([rows[i] for i in stored])).to(self.device)
+        if not missing:
+            return vecs
+        new = self.encode_texts([texts[i] for i in missing])
+        self.indexer.add_encoded([texts[i] for i in missing], new.cpu().numpy())
+        t_emb = torch.empty((len(texts), vecs.shape[1]), dtype=vecs.dtype, device=self.device)
+        t_emb[torch.tensor(stored, device=self.device)] = vecs
+        t_emb[torch.tensor(missing, device=self.device)] = new.to(device=self.device, dtype=vecs.dtype)
+        return t_emb
 
-        if len(triples) <= top_k:
-            return triples
+    def ingest(self, triples: Sequence[Dict]) -> None:
+        """Encode triples missing from the embedding store in the background (no-op without a store)."""
+        if self.indexer is not None:
+            self.indexer.ingest(triples)
 
-        texts = [self._triple_to_text(t) for t in triples]
+    def embedding_stats(self) -> Dict:
+        return self.indexer.stats() if self.indexer is not None else {}
 
-        q_emb = self.model.encode(
-            [question], convert_to_tensor=True, normalize_embeddings=True
-        )
-        t_emb = self.model.encode(
-            texts, convert_to_tensor=True, normalize_embeddings=True
-        )
+    def encode_question(self, question: str) -> torch.Tensor:
+        """(1, dim) normalized question embedding, served from the LRU cache when possible."""
+        return self.encode_questions([question])
 
-        scores = torch.mm(q_emb, t_emb.T).squeeze(0).cpu().tolist()
+    def encode_questions(self, questions: Sequence[str]) -> torch.Tensor:
+        """(n, dim) normalized embeddings; cache misses are encoded together."""
+        cache = self.question_cache
+        embs: List[Optional[torch.Tensor]] = [None] * len(questions)
+        missing: Dict[str, List[int]] = {}
+        for i, question in enumerate(questions):
+            cached = cache.get(self._cache_key(question)) if cache is not None else None
+            if cached is not None:
+                embs[i] = cached.to(self.device)
+            else:
+                missing.setdefault(question, []).append(i)
 
-        for triple, score in zip(triples, scores):
-            triple["retriever_score"] = triple.get("score", 0.0)
-            triple["score"] = float(score)
+        if missing:
+            t0 = time.perf_counter()
+            new = self.model.encode(
+                list(missing), convert_to_tensor=True, normalize_embeddings=True
+            )
+            elapsed = time.perf_counter() - t0
+            for row, (question, positions) in enumerate(missing.items()):
+                q_emb = new[row : row + 1].clone()  # don't pin the whole batch in the cache
+                if cache is not None:
+                    cache.record_encode(elapsed / len(missing))
+                    cache.put(self._cache_key(question), q_emb)
+                for i in positions:
+                    embs[i] = q_emb
+        return torch.cat(embs, dim=0)
 
-        return sorted(triples, key=lambda x: x["score"], reverse=True)[:top_k]
+    def _cache_key(self, question: str):
+        return QuestionEmbeddingCache.key(self.model_name, question, lowercase=self._uncased)
 
     @staticmethod
     def _triple_to_text(triple: Dict) -> str:
@@ -0,0 +1,339 @@
+"""
+Time-partitioned retrieval over many ICEWS years.
+
+ShardedRetriever.build() splits TSV sources into per-year (or per-month) shard
+files plus a small manifest.json: date range, event count, global id offset and
+a Bloom filter of lowercased entity keys per shard. At query time only shards
+whose date range overlaps the extracted dates (± tolerance) and whose filter
+may contain a query entity are consulted. Shards are BaselineRetriever
+instances, loaded on demand and evicted LRU-first once the resident event
+count passes max_resident_events.
+"""
+from __future__ import annotations
+
+import base64
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, List, Set
+
+from retrieval.baseline_retriever import BaselineRetriever, match_relation_names, _date_interval, _date_ordinal
+from retrieval.candidate import Candidate
+
+
+MANIFEST_NAME = "manifest.json"
+
+
+class _BloomFilter:
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytearray | None = None):
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, num_hashes)
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n: int, fp_rate: float = 0.01) -> "_BloomFilter":
+        # m = -n ln p / (ln 2)^2, k = m/n ln 2
+        n = max(1, n)
+        ln2 = math.log(2)
+        num_bits = int(-n * math.log(fp_rate) / (ln2 * ln2)) + 1
+        return cls(num_bits, max(1, round(num_bits / n * ln2)))
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def to_json(self) -> Dict:
+        return {"bits": self.num_bits, "hashes": self.num_hashes,
+                "data": base64.b64encode(bytes(self.bits)).decode("ascii")}
+
+    @classmethod
+    def from_json(cls, d: Dict) -> "_BloomFilter":
+        return cls(d["bits"], d["hashes"], bytearray(base64.b64decode(d["data"])))
+
+
+def _prefer_relations(candidates: List[Candidate], relations: List[str] | None,
+                      restrict_relations: bool) -> List[Candidate]:
+    """Relation-matching candidates first (only those, if restricted and any match)."""
+    if not relations:
+        return candidates
+    wanted = set(relations)
+    preferred = [c for c in candidates if c.get("relation") in wanted]
+    if restrict_relations:
+        return preferred or candidates
+    return preferred + [c for c in candidates if c.get("relation") not in wanted]
+
+
+class ShardedRetriever:
+    def __init__(
+        self,
+        shard_dir: str,
+        cap: int = 1000,
+        max_resident_events: int = 5_000_000,
+        ranked: bool = False,
+        tolerance_days: int = 30,
+        dedup: bool = True,
+    ):
+        self.shard_dir = shard_dir
+        self.cap = cap
+        self.max_resident_events = max_resident_events
+        self.ranked = ranked
+        self.tolerance_days = tolerance_days
+        self.dedup = dedup
+
+        with open(os.path.join(shard_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        self.shards: List[Dict] = manifest["shards"]
+        self.relations: List[str] = manifest.get("relations", [])
+        for shard in self.shards:
+            shard["_bloom"] = _BloomFilter.from_json(shard["entities"])
+            shard["_start"] = date.fromisoformat(shard["start"]).toordinal()
+            shard["_end"] = date.fromisoformat(shard["end"]).toordinal()
+
+        self._loaded: "OrderedDict[str, BaselineRetriever]" = OrderedDict()
+        self._resident_events = 0
+        self._lock = threading.Lock()
+        self._relation_matches: Dict[tuple, List[str]] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------ build
+    @staticmethod
+    def build(sources: List[str], shard_dir: str, granularity: str = "year", fp_rate: float = 0.01) -> Dict:
+        """Partition ICEWS TSV files (head, relation, tail, date) into shards + manifest."""
+        if granularity not in {"year", "month"}:
+            raise ValueError("granularity must be 'year' or 'month'")
+        os.makedirs(shard_dir, exist_ok=True)
+        width = 4 if granularity == "year" else 7
+
+        files = {}
+        stats: Dict[str, Dict] = {}
+        relations: Set[str] = set()
+        try:
+            for path in sources:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        parts = line.rstrip("\n").split("\t")
+                        if len(parts) < 4 or len(parts[3]) < width:
+                            continue
+                        name = parts[3][:width]
+                        out = files.get(name)
+                        if out is None:
+                            out = files[name] = open(os.path.join(shard_dir, f"{name}.tsv"), "w", encoding="utf-8")
+                            stats[name] = {"events": 0, "min": parts[3][:10], "max": parts[3][:10], "keys": set()}
+                        out.write("\t".join(parts[:4]) + "\n")
+
+                        st = stats[name]
+                        st["events"] += 1
+                        st["min"] = min(st["min"], parts[3][:10])
+                        st["max"] = max(st["max"], parts[3][:10])
+                        for ent in (parts[0], parts[2]):
+                            if ent:
+                                st["keys"].add(ent.lower())
+                        relations.add(parts[1])
+        finally:
+            for out in files.values():
+                out.close()
+
+        shards = []
+        offset = 0
+        for name in sorted(stats):
+            st = stats[name]
+            bloom = _BloomFilter.for_capacity(len(st["keys"]), fp_rate)
+            for key in st["keys"]:
+                bloom.add(key)
+            shards.append({
+                "name": name,
+                "path": f"{name}.tsv",
+                "start": st["min"],
+                "end": st["max"],
+                "events": st["events"],
+                "offset": offset,
+                "entities": bloom.to_json(),
+            })
+            offset += st["events"]
+
+        manifest = {"granularity": granularity, "relations": sorted(relations), "shards": shards}
+        with open(os.path.join(shard_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        return manifest
+
+    # ---------------------------------------------------------------- routing
+    def route(self, entities: List[str], dates: List[Dict] | None = None, fuzzy: bool = False) -> List[Dict]:
+        """Shards overlapping the query dates (± tolerance) that may hold a query entity."""
+        tol = self.tolerance_days
+        intervals = [iv for iv in (_date_interval(d) for d in (dates or [])) if iv]
+        windows = [(lo - tol, hi + tol) for lo, hi in intervals]
+        keys = [e.lower() for e in entities if e]
+
+        out = []
+        for shard in self.shards:
+            if windows and not any(lo <= shard["_end"] and shard["_start"] <= hi for lo, hi in windows):
+                continue
+            if not fuzzy and not any(k in shard["_bloom"] for k in keys):
+                continue
+            out.append(shard)
+        return out
+
+    def _shard(self, shard: Dict, pinned: Set[str]) -> BaselineRetriever:
+        name = shard["name"]
+        with self._lock:
+            retriever = self._loaded.get(name)
+            if retriever is not None:
+                self._loaded.move_to_end(name)
+                return retriever
+
+            retriever = BaselineRetriever(
+                events_path=os.path.join(self.shard_dir, shard["path"]),
+                cap=self.cap,
+                ranked=self.ranked,
+                tolerance_days=self.tolerance_days,
+                dedup=self.dedup,
+            )
+            self._loaded[name] = retriever
+            self._resident_events += shard["events"]
+            self.loads += 1
+
+            # evict least recently used shards not needed by the current query
+            for old in list(self._loaded):
+                if self._resident_events <= self.max_resident_events:
+                    break
+                if old in pinned:
+                    continue
+                self._loaded.pop(old)
+                self._resident_events -= self._shard_by_name(old)["events"]
+                self.evictions += 1
+            return retriever
+
+    def _shard_by_name(self, name: str) -> Dict:
+        return next(s for s in self.shards if s["name"] == name)
+
+    @property
+    def resident_shards(self) -> List[str]:
+        return list(self._loaded)
+
+    @property
+    def n_events(self) -> int:
+        """Size of the global event id space (shard offsets count raw lines, so some ids may be unused)."""
+        last = self.shards[-1] if self.shards else None
+        return last["offset"] + last["events"] if last else 0
+
+    def get_events(self, ids: Iterable[int]) -> List[Dict]:
+        """BaselineRetriever.get_events over global ids; each shard holding one is loaded once."""
+        ids = list(ids)
+        offsets = [s["offset"] for s in self.shards]
+        owners = [bisect.bisect_right(offsets, i) - 1 for i in ids]
+        if any(n < 0 for n in owners):
+            raise IndexError("event id before the first shard")
+        needed = sorted(set(owners))
+        pinned = {self.shards[n]["name"] for n in needed}
+        retrievers = {n: self._shard(self.shards[n], pinned) for n in needed}
+
+        out = []
+        for i, n in zip(ids, owners):
+            event = dict(retrievers[n].events[i - offsets[n]])
+            event["event_id"] = i
+            out.append(event)
+        return out
+
+    # -------------------------------------------------------------- retrieval
+    def match_relations(self, keywords: Iterable[str]) -> List[str]:
+        key = tuple(sorted({k.lower() for k in keywords if k}))
+        cached = self._relation_matches.get(key)
+        if cached is None:
+            cached = match_relation_names(self.relations, key)
+            self._relation_matches[key] = cached
+        return cached
+
+    def retrieve(
+        self,
+        entities: List[str],
+        cap: int | None = None,
+        relations: List[str] | None = None,
+        restrict_relations: bool = False,
+        dates: List[Dict] | None = None,
+        ranked: bool | None = None,
+        allow_fallback: bool = True,
+    ) -> List[Candidate]:
+        """Same contract as BaselineRetriever.retrieve; event ids are global across shards."""
+        cap = cap or self.cap
+        ranked = self.ranked if ranked is None else ranked
+        kwargs = dict(cap=cap, relations=relations, restrict_relations=restrict_relations,
+                      dates=dates, ranked=ranked, allow_fallback=False)
+
+        per_shard = self._query(self.route(entities, dates), entities, kwargs)
+        if not any(per_shard) and allow_fallback:
+            # substring fallback can't use the entity filters; date routing still applies.
+            # Shards must not fall back to their date window here: one shard's date-only
+            # rows would hide another shard's substring matches.
+            kwargs.update(allow_fallback=True, date_fallback=False)
+            shards = self.route(entities, dates, fuzzy=True)
+            per_shard = self._query(shards, entities, kwargs)
+            if not any(per_shard) and dates:
+                return self._retrieve_by_date(shards, cap, relations, restrict_relations, dates, ranked)
+
+        if ranked:
+            # every shard list is sorted by score; shard order breaks ties
+            merged = heapq.merge(
+                *[[(-c.score, n, i, c) for i, c in enumerate(lst)] for n, lst in enumerate(per_shard)]
+            )
+            return [c for *_, c in merged][:cap]
+
+        candidates = [c for lst in per_shard for c in lst]
+        return _prefer_relations(candidates, relations, restrict_relations)[:cap]
+
+    def retrieve_by_date(self, dates: List[Dict], cap: int | None = None, relations: List[str] | None = None,
+                         restrict_relations: bool = False, ranked: bool | None = None) -> List[Candidate]:
+        """Same contract as BaselineRetriever.retrieve_by_date, over the shards the dates route to."""
+        cap = cap or self.cap
+        ranked = self.ranked if ranked is None else ranked
+        shards = self.route([], dates, fuzzy=True)
+        return self._retrieve_by_date(shards, cap, relations, restrict_relations, dates, ranked)
+
+    def _retrieve_by_date(self, shards: List[Dict], cap: int, relations: List[str] | None,
+                          restrict_relations: bool, dates: List[Dict], ranked: bool) -> List[Candidate]:
+        """BaselineRetriever.retrieve_by_date over the date-routed shards, merged nearest day first."""
+        pinned = {s["name"] for s in shards}
+        candidates = []
+        for shard in shards:
+            offset = shard["offset"]
+            local = self._shard(shard, pinned).retrieve_by_date(dates, cap, relations, restrict_relations, ranked)
+            candidates.extend(Candidate(offset + c.event_id, c.event, c.score) for c in local)
+        if ranked:
+            # the score already decays with the distance to the query dates
+            candidates.sort(key=lambda c: -c.score)
+            return candidates[:cap]
+
+        intervals = [iv for iv in (_date_interval(d) for d in dates) if iv]
+
+        def distance(c: Candidate) -> int:
+            d = _date_ordinal(c.get("date", ""))
+            return min(lo - d if d < lo else max(0, d - hi) for lo, hi in intervals)
+
+        candidates.sort(key=distance)  # stable: shard order within a distance
+        return _prefer_relations(candidates, relations, restrict_relations)[:cap]
+
+    def _query(self, shards: List[Dict], entities: List[str], kwargs: Dict) -> List[List[Candidate]]:
+        pinned = {s["name"] for s in shards}
+        out = []
+        for shard in shards:
+            offset = shard["offset"]
+            local = self._shard(shard, pinned).retrieve(entities, **kwargs)
+            out.append([Candidate(offset + c.event_id, c.event, c.score) for c in local])
+        return out
@@ -1,7 +1,9 @@
+import argparse
 import json
-from typing import Dict, List, Any
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
-from encoder_reranker_stub import EncoderReranker
+from encoder_reranker_stub import EncoderReranker, HashedTfidfReranker
 
 
 def _is_gold(c: Dict[str, Any], g: Dict[str, Any]) -> bool:
@@ -24,8 +26,46 @@ def mrr_at_k(ranked: List[Dict[str, Any]], gold: Dict[str, Any], k: int) -> floa
     return 0.0
 
 
+def iter_bundle(bundle_path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Yield the examples of a JSON-array bundle one at a time without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    started = False
+
+    with open(bundle_path, "r", encoding="utf-8") as f:
+        while True:
+            # skip whitespace / separators, then decode one complete value
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buf):
+                if buf[pos] != "[":
+                    raise ValueError(f"{bundle_path}: expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if started and pos < len(buf) and buf[pos] == "]":
+                return
+            if pos < len(buf):
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                    yield obj
+                    pos = end
+                    continue
+                except json.JSONDecodeError:
+                    pass  # value spans the chunk boundary: read more
+
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if buf[pos:].strip():
+                    raise ValueError(f"{bundle_path}: truncated JSON array")
+                return
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
 def evaluate(bundle_path: str, reranker: EncoderReranker, k: int = 10) -> Dict[str, float]:
-    data = json.load(open(bundle_path, "r", encoding="utf-8"))
+    data = iter_bundle(bundle_path)
     n = 0
     h1 = h5 = h10 = 0
     mrr = 0.0
@@ -52,8 +92,127 @@ def evaluate(bundle_path: str, reranker: EncoderReranker, k: int = 10) -> Dict[s
     }
 
 
+def _summary(ranks: List[Optional[int]]) -> Dict[str, float]:
+    n = len(ranks)
+    return {
+        "n": n,
+        "Hit@1": sum(1 for r in ranks if r and r <= 1) / n if n else 0.0,
+        "Hit@5": sum(1 for r in ranks if r and r <= 5) / n if n else 0.0,
+        "Hit@10": sum(1 for r in ranks if r and r <= 10) / n if n else 0.0,
+        "MRR@10": sum(1.0 / r for r in ranks if r) / n if n else 0.0,
+    }
+
+
+def evaluate_deduplicated(
+    bundle_path: str,
+    encode: Callable[[List[str]], Any],
+    k: int = 10,
+    block_size: int = 1024,
+    text_of: Callable[[Dict[str, Any]], str] = EncoderReranker.triple_to_text,
+    encode_questions: Optional[Callable[[List[str]], Any]] = None,
+) -> Dict[str, float]:
+    """
+    Same metrics as evaluate() for an embedding reranker, with bundle-wide dedup.
+
+    `encode(texts)` returns L2-normalized embeddings (n, dim) of candidate texts
+    built by `text_of`; questions go through `encode_questions` (default:
+    `encode`). Both must match the reranker being reproduced (see
+    make_dedup_encoders). Unique candidate texts and questions across the
+    streamed bundle are each encoded once; scores come from one question x
+    candidate product computed block by block (a block of questions against the
+    union of their candidates). Ties keep candidate order, as sorted() does in
+    rerank(), and examples with k or fewer candidates keep their input order
+    (rerank() returns those unscored).
+    """
+    import numpy as np
+
+    text_ids: Dict[str, int] = {}
+    question_ids: Dict[str, int] = {}
+    examples = []  # (question id, candidate text ids, gold positions)
+
+    for ex in iter_bundle(bundle_path):
+        gold = ex["gold"]
+        cand_ids = []
+        gold_pos = []
+        for i, c in enumerate(ex["candidates"]):
+            cand_ids.append(text_ids.setdefault(text_of(c), len(text_ids)))
+            if _is_gold(c, gold):
+                gold_pos.append(i)
+        q_id = question_ids.setdefault(ex["question"], len(question_ids))
+        examples.append((q_id, np.asarray(cand_ids, dtype=np.int64), gold_pos))
+
+    texts = np.asarray(encode(list(text_ids)), dtype=np.float32) if text_ids else None
+    encode_questions = encode_questions or encode
+    questions = np.asarray(encode_questions(list(question_ids)), dtype=np.float32) if question_ids else None
+    del text_ids, question_ids
+
+    ranks: List[Optional[int]] = []
+    for start in range(0, len(examples), block_size):
+        block = examples[start:start + block_size]
+        union, inverse = np.unique(np.concatenate([c for _, c, _ in block] or [np.zeros(0, np.int64)]),
+                                   return_inverse=True)
+        scores = questions[[q for q, _, _ in block]] @ texts[union].T if len(union) else None
+
+        offset = 0
+        for row, (_, cand_ids, gold_pos) in enumerate(block):
+            cols = inverse[offset:offset + len(cand_ids)]
+            offset += len(cand_ids)
+            if not gold_pos:
+                ranks.append(None)
+                continue
+            if len(cand_ids) <= k:
+                order = np.arange(len(cand_ids))
+            else:
+                order = np.argsort(-scores[row, cols], kind="stable")[:k]
+            hit = [r for r, i in enumerate(order.tolist(), 1) if i in gold_pos]
+            ranks.append(hit[0] if hit else None)
+
+    return _summary(ranks)
+
+
+def make_reranker(backend: str, model_name: str):
+    if backend == "tfidf":
+        return HashedTfidfReranker()
+    if backend == "encoder":
+        # full transformer reranker from the pipeline (same rerank() signature)
+        from retrieval.encoder_reranker import EncoderReranker as TransformerReranker
+        return TransformerReranker(model_name=model_name, device="cpu")
+    return EncoderReranker(model_name=model_name)
+
+
+def make_dedup_encoders(backend: str, model_name: str):
+    """(encode texts, encode questions, triple -> text) matching make_reranker(backend)'s scoring."""
+    if backend == "encoder":
+        from retrieval.encoder_reranker import EncoderReranker as TransformerReranker
+
+        rr = TransformerReranker(model_name=model_name, device="cpu")
+        return (
+            lambda texts: rr.encode_texts(texts).cpu().numpy(),
+            lambda questions: rr.encode_questions(questions).cpu().numpy(),
+            TransformerReranker._triple_to_text,
+        )
+    # stub ranks by retriever_score and tfidf by per-question IDF: nothing to share across examples
+    raise ValueError(f"--dedup needs the embedding backend (encoder), not {backend!r}")
+
+
 if __name__ == "__main__":
-    bundle = "reranker_eval_bundle.json"
-    rr = EncoderReranker(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    scores = evaluate(bundle, rr, k=10)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bundle", default="reranker_eval_bundle.json")
+    ap.add_argument("--backend", choices=["stub", "tfidf", "encoder"], default="stub")
+    ap.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    ap.add_argument("--dedup", action="store_true",
+                    help="Encode unique candidate texts once across the bundle (encoder backend only)")
+    args = ap.parse_args()
+
+    if args.dedup and args.backend != "encoder":
+        ap.error("--dedup needs the embedding backend (--backend encoder)")
+
+    t0 = time.perf_counter()
+    if args.dedup:
+        encode, encode_questions, text_of = make_dedup_encoders(args.backend, args.model)
+        scores = evaluate_deduplicated(args.bundle, encode, k=10, text_of=text_of, encode_questions=encode_questions)
+    else:
+        rr = make_reranker(args.backend, args.model)
+        scores = evaluate(args.bundle, rr, k=10)
+    scores["ms_per_query"] = (time.perf_counter() - t0) * 1000.0 / max(1, scores["n"])
     print(scores)
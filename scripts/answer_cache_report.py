@@ -0,0 +1,119 @@
+"""
+Hit rates and latency savings of the pipeline's answer caches on reworded questions.
+
+Every question of the dataset is asked in several wordings that keep its
+entities and dates ("Quick question: ...", "Can you tell me: ...", ...), in a
+shuffled order, once on a pipeline without the candidate/rerank caches and once
+on one built with them (question-embedding cache cleared before each pass). Reports latency per
+pass, hit rates per cache level, and how often the cached answer equals the
+uncached one (the rerank cache is approximate).
+
+    python scripts/answer_cache_report.py --dataset Synthetic_QA.json --bits 8
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from eval.utils import format_table, percentile
+from pipeline import TKGQAPipeline
+
+WORDINGS = (
+    "{q}",
+    "Quick question: {q}",
+    "Can you tell me: {q}",
+    "{q} Thanks.",
+)
+
+
+def cache_deltas(after: Dict, before: Dict) -> Dict:
+    """Hits / misses / hit rate per cache level accrued between two answer_cache_stats() calls."""
+    out = {}
+    for level, st in after.items():
+        hits = st["hits"] - before[level]["hits"]
+        misses = st["misses"] - before[level]["misses"]
+        out[level] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+    return out
+
+
+def run_pass(pipeline: TKGQAPipeline, questions: List[str], options: Dict) -> Dict:
+    if pipeline.encoder.question_cache is not None:
+        pipeline.encoder.question_cache.clear()
+    latencies, answers = [], []
+    for q in questions:
+        t0 = time.perf_counter()
+        result = pipeline.process(q, **options)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        answers.append([t["event_id"] for t in result["final_triples"]])
+    return {"ms": latencies, "answers": answers}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", default="Synthetic_QA.json")
+    ap.add_argument("--icews", default="icews_2014_train.txt")
+    ap.add_argument("--graph", default="implicit_relation_graph.json")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--bits", type=int, default=8, help="SimHash bits of the rerank cache key")
+    ap.add_argument("--ttl", type=float, default=600.0)
+    ap.add_argument("--no_reranker", action="store_true")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        base = [ex.get("question_implicit") or ex["question"] for ex in json.load(f)]
+    questions = [w.format(q=q) for q in base for w in WORDINGS]
+    random.Random(args.seed).shuffle(questions)
+
+    options = dict(use_reranker=not args.no_reranker)
+    cache_kwargs = dict(candidate_cache_size=10_000, rerank_cache_size=10_000, answer_cache_ttl=args.ttl,
+                        rerank_cache_bits=args.bits)
+
+    passes = {}
+    for name, kwargs in (("uncached", {}), ("cached", cache_kwargs)):
+        pipeline = TKGQAPipeline(implicit_graph_path=args.graph, icews_path=args.icews,
+                                 encoder_model_name=args.model, **kwargs)
+        for q in base[:5]:
+            pipeline.process(q, **options)  # warm-up
+        for cache in (pipeline.candidate_cache, pipeline.rerank_cache):
+            if cache is not None:
+                cache.clear()  # no head start from the warm-up
+        before = pipeline.answer_cache_stats()
+        passes[name] = run_pass(pipeline, questions, options)
+        if kwargs:
+            stats = cache_deltas(pipeline.answer_cache_stats(), before)
+        del pipeline
+        gc.collect()
+    uncached, cached = passes["uncached"], passes["cached"]
+
+    same = sum(a == b for a, b in zip(uncached["answers"], cached["answers"])) / len(questions)
+    rows = []
+    for name, res in (("uncached", uncached), ("cached", cached)):
+        rows.append({
+            "Pass": name,
+            "Mean ms": sum(res["ms"]) / len(res["ms"]),
+            "p50 ms": percentile(res["ms"], 50),
+            "p95 ms": percentile(res["ms"], 95),
+            "L1 hit rate": stats["candidates"]["hit_rate"] if name == "cached" else "-",
+            "L2 hit rate": stats["rerank"]["hit_rate"] if name == "cached" else "-",
+            "Same answer": same if name == "cached" else "-",
+        })
+
+    saved = sum(uncached["ms"]) - sum(cached["ms"])
+    print(f"\n{len(base)} questions x {len(WORDINGS)} wordings from {args.dataset}, "
+          f"rerank cache bucket = {args.bits}-bit SimHash")
+    print(format_table(rows, float_cols=tuple(c for c in rows[0] if c != "Pass")))
+    print(f"saved {saved / 1000.0:.2f}s of {sum(uncached['ms']) / 1000.0:.2f}s "
+          f"({saved / sum(uncached['ms']):.1%})")
+    print(f"L1 {stats['candidates']['hits']}/{stats['candidates']['hits'] + stats['candidates']['misses']} hits, "
+          f"L2 {stats['rerank']['hits']}/{stats['rerank']['hits'] + stats['rerank']['misses']} hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Response size and serialization time: full results vs. compact mode.
+
+Every question is answered in both modes. Per mode the table reports the
+process() latency, json.dumps time and the serialized size; the last row adds
+what a compact caller pays to fetch all returned triples through get_events().
+
+    python scripts/bench_compact_results.py --dataset mini_qa_devset.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from eval.utils import format_table, percentile
+from pipeline import TKGQAPipeline
+
+
+def row(name: str, m: Dict[str, List[float]]) -> Dict:
+    n = len(m["bytes"]) or 1
+    return {
+        "Mode": name,
+        "process p50 ms": percentile(m["process"], 50),
+        "dumps p50 ms": percentile(m["dumps"], 50),
+        "dumps p95 ms": percentile(m["dumps"], 95),
+        "Mean KB": sum(m["bytes"]) / n / 1024,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", default="mini_qa_devset.json")
+    ap.add_argument("--icews", default="icews_2014_train.txt")
+    ap.add_argument("--graph", default="implicit_relation_graph.json")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--encoder_top_k", type=int, default=10)
+    ap.add_argument("--no_reranker", action="store_true")
+    ap.add_argument("--limit", type=int, default=200)
+    args = ap.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        questions = [ex.get("question_implicit") or ex["question"] for ex in json.load(f)][: args.limit]
+
+    pipeline = TKGQAPipeline(implicit_graph_path=args.graph, icews_path=args.icews, encoder_model_name=args.model)
+    options = dict(encoder_top_k=args.encoder_top_k, use_reranker=not args.no_reranker)
+
+    modes = {m: {"process": [], "dumps": [], "bytes": []} for m in ("full", "compact", "compact + get_events")}
+    for q in questions:
+        for compact in (False, True):
+            t0 = time.perf_counter()
+            result = pipeline.process(q, compact=compact, **options)
+            t1 = time.perf_counter()
+            body = json.dumps(result, ensure_ascii=False)
+            t2 = time.perf_counter()
+            m = modes["compact" if compact else "full"]
+            m["process"].append((t1 - t0) * 1000.0)
+            m["dumps"].append((t2 - t1) * 1000.0)
+            m["bytes"].append(len(body.encode("utf-8")))
+
+        # on-demand fetch of every returned triple, as a follow-up response
+        t0 = time.perf_counter()
+        events = pipeline.get_events(result["event_ids"], index_version=result["index_version"])
+        extra = json.dumps(events, ensure_ascii=False)
+        m = modes["compact + get_events"]
+        m["process"].append(modes["compact"]["process"][-1])
+        m["dumps"].append(modes["compact"]["dumps"][-1] + (time.perf_counter() - t0) * 1000.0)
+        m["bytes"].append(modes["compact"]["bytes"][-1] + len(extra.encode("utf-8")))
+
+    rows = [row(name, m) for name, m in modes.items()]
+    full_kb, compact_kb = rows[0]["Mean KB"], rows[1]["Mean KB"]
+    print(f"\n{len(questions)} questions, encoder_top_k={args.encoder_top_k}, "
+          f"compact is {full_kb / compact_kb if compact_kb else 0:.1f}x smaller")
+    print(format_table(rows, float_cols=tuple(c for c in rows[0] if c != "Mode")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Latency/accuracy trade-off of TKGQAPipeline.process(latency_budget_ms=...).
+
+For each budget the dev set is answered `--rounds` times; reports p50/p99
+latency, how often each degradation fired, and Hit@k / MRR against the gold
+quadruple (no budget = reference row).
+
+    python scripts/bench_deadline.py --budgets 250 500 1000
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pipeline import TKGQAPipeline
+from eval.utils import compute_hit_mrr, format_table, percentile
+
+
+def gold_rank(results: Dict, gold: Dict, top_k: int) -> Optional[int]:
+    for rank, c in enumerate(results["final_triples"][:top_k], start=1):
+        if (c.get("head"), c.get("relation"), c.get("tail"), c.get("date")) == (
+            gold.get("s"), gold.get("p"), gold.get("o"), gold.get("t")
+        ):
+            return rank
+    return None
+
+
+def run_budget(pipeline: TKGQAPipeline, data: List[Dict], budget: Optional[float],
+               rounds: int, top_k: int) -> Dict:
+    latencies: List[float] = []
+    ranks: List[Optional[int]] = []
+    degradations: Counter = Counter()
+
+    for _ in range(rounds):
+        for item in data:
+            results = pipeline.process(item["question_implicit"], latency_budget_ms=budget)
+            latencies.append(results["latency_ms"])
+            ranks.append(gold_rank(results, item["quadruple"], top_k))
+            for d in results["degradations"]:
+                degradations[d.split(":")[0]] += 1
+
+    metrics = compute_hit_mrr(ranks, k=top_k)
+    n = len(latencies)
+    return {
+        "Budget ms": "none" if budget is None else budget,
+        "p50 ms": percentile(latencies, 50),
+        "p99 ms": percentile(latencies, 99),
+        f"Hit@{top_k}": metrics[f"hit@{top_k}"],
+        "MRR": metrics["mrr"],
+        "Degraded": ", ".join(f"{k}={v / n:.0%}" for k, v in sorted(degradations.items())) or "-",
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", default="mini_qa_devset.json")
+    ap.add_argument("--icews", default="icews_2014_train.txt")
+    ap.add_argument("--graph", default="implicit_relation_graph.json")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--budgets", type=float, nargs="+", default=[250.0, 500.0, 1000.0])
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--top_k", type=int, default=10)
+    args = ap.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    pipeline = TKGQAPipeline(
+        implicit_graph_path=args.graph,
+        icews_path=args.icews,
+        encoder_model_name=args.model,
+    )
+
+    # warm-up pass also seeds the per-stage cost estimates
+    for item in data:
+        pipeline.process(item["question_implicit"])
+
+    rows = [run_budget(pipeline, data, None, args.rounds, args.top_k)]
+    for budget in args.budgets:
+        rows.append(run_budget(pipeline, data, budget, args.rounds, args.top_k))
+
+    print(format_table(rows, float_cols=("p50 ms", "p99 ms", f"Hit@{args.top_k}", "MRR")))
+    print("\nstage cost estimates (ms):", {k: round(v, 3) for k, v in pipeline.costs.snapshot().items()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Texts/sec of EncoderReranker candidate encoding: plain model.encode (default
+batch size and ordering) vs. the length-bucketed EncodingEngine, before and
+after autotune. Candidate texts come from the reranker eval bundle.
+
+    python scripts/bench_encoding.py --model BAAI/bge-large-en-v1.5 --n 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from retrieval.encoder_reranker import EncoderReranker
+from retrieval.encoding_engine import AUTOTUNE_SAMPLE
+from eval.utils import format_table
+
+
+def timed(fn, texts, repeats: int) -> float:
+    fn(texts[:32])  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn(texts)
+    return len(texts) * repeats / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bundle", default="reranker_eval_bundle.json")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--n", type=int, default=2000, help="Number of candidate texts")
+    ap.add_argument("--repeats", type=int, default=2)
+    args = ap.parse_args()
+
+    with open(args.bundle, "r", encoding="utf-8") as f:
+        triples = [c for ex in json.load(f) for c in ex["candidates"]]
+    texts = [EncoderReranker._triple_to_text(t) for t in triples]
+    texts = (texts * (args.n // max(1, len(texts)) + 1))[: args.n]
+
+    rr = EncoderReranker(model_name=args.model, device=args.device)
+    engine = rr.engine
+
+    rows = [{
+        "Mode": "model.encode (default)",
+        "Texts/sec": timed(lambda t: rr.model.encode(t, convert_to_tensor=True, normalize_embeddings=True),
+                           texts, args.repeats),
+    }]
+    rows.append({
+        "Mode": f"engine (budget={engine.token_budget})",
+        "Texts/sec": timed(engine.encode, texts, args.repeats),
+    })
+    # tune on as many triples as the pipeline does, repeating the bundle if it is smaller
+    sample = (triples * (AUTOTUNE_SAMPLE // max(1, len(triples)) + 1))[:AUTOTUNE_SAMPLE]
+    budget = rr.autotune(sample)
+    rows.append({
+        "Mode": f"engine autotuned (budget={budget})",
+        "Texts/sec": timed(engine.encode, texts, args.repeats),
+    })
+
+    base = rows[0]["Texts/sec"]
+    for r in rows:
+        r["Speed-up"] = r["Texts/sec"] / base if base else 0.0
+    print(format_table(rows, float_cols=("Texts/sec", "Speed-up")))
+    print("autotune texts/sec by budget:", {k: round(v, 1) for k, v in engine.throughput.items()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Retrieve latency for the most frequent entities, with and without heavy-hitter summaries.
+
+Builds the index twice (heavy_hitter_min=0 disables the summaries), then times
+retrieve() for the top-N entity keys under four query shapes: entity only,
+entity + relation prior, entity + date, entity + relation + date. Also reports
+the share of returned events in the query's month for dated queries,
+since the heavy path fills the cap from the relevant month buckets first.
+
+    python scripts/bench_heavy_hitters.py --icews icews_2014_train.txt --top 100
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from retrieval.baseline_retriever import BaselineRetriever, HEAVY_HITTER_MIN
+from eval.utils import format_table, percentile
+
+
+def make_queries(retriever: BaselineRetriever, top: int, seed: int = 0) -> List[Dict]:
+    rnd = random.Random(seed)
+    keys = sorted(retriever.entity_index_lc, key=lambda k: len(retriever.entity_index_lc[k]), reverse=True)[:top]
+    queries = []
+    for key in keys:
+        event = retriever.events[rnd.choice(sorted(retriever.entity_index_lc[key]))]
+        entity = event["head"] if event["head"].lower() == key else event["tail"]
+        relations = [event["relation"]]
+        dates = [{"date": event["date"][:10], "format": "iso"}]
+        queries += [
+            {"shape": "entity", "entities": [entity]},
+            {"shape": "+relation", "entities": [entity], "relations": relations},
+            {"shape": "+date", "entities": [entity], "dates": dates},
+            {"shape": "+relation+date", "entities": [entity], "relations": relations, "dates": dates},
+        ]
+    return queries
+
+
+def in_month(results, dates: List[Dict]) -> float:
+    if not results or not dates:
+        return 0.0
+    month = dates[0]["date"][:7]
+    return sum(c.get("date", "")[:7] == month for c in results) / len(results)
+
+
+def bench(retriever: BaselineRetriever, queries: List[Dict], rounds: int, ranked: bool) -> Dict[str, Dict]:
+    out: Dict[str, Dict] = {}
+    for q in queries:
+        kwargs = {k: v for k, v in q.items() if k in {"relations", "dates"}}
+        times = []
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            results = retriever.retrieve(q["entities"], ranked=ranked, **kwargs)
+            times.append((time.perf_counter() - t0) * 1000.0)
+        row = out.setdefault(q["shape"], {"ms": [], "in_month": []})
+        row["ms"].append(min(times))
+        if "dates" in q:
+            row["in_month"].append(in_month(results, q["dates"]))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--icews", default="icews_2014_train.txt")
+    ap.add_argument("--top", type=int, default=100, help="Number of most frequent entity keys to query")
+    ap.add_argument("--cap", type=int, default=1000)
+    ap.add_argument("--threshold", type=int, default=HEAVY_HITTER_MIN, help="heavy_hitter_min for the 'after' index")
+    ap.add_argument("--rounds", type=int, default=5, help="Timed repetitions per query (min is kept)")
+    ap.add_argument("--ranked", action="store_true", help="Benchmark ranked retrieval instead of unranked")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    before = BaselineRetriever(args.icews, cap=args.cap, heavy_hitter_min=0)
+    t1 = time.perf_counter()
+    after = BaselineRetriever(args.icews, cap=args.cap, heavy_hitter_min=args.threshold)
+    t2 = time.perf_counter()
+    print(f"index build: {t1 - t0:.1f}s without summaries, {t2 - t1:.1f}s with "
+          f"({len(after.heavy)} heavy keys >= {args.threshold} events)")
+
+    queries = make_queries(before, args.top)
+    res_before = bench(before, queries, args.rounds, args.ranked)
+    res_after = bench(after, queries, args.rounds, args.ranked)
+
+    rows = []
+    for shape in res_before:
+        b, a = res_before[shape], res_after[shape]
+        p50_b, p50_a = percentile(b["ms"], 50), percentile(a["ms"], 50)
+        rows.append({
+            "Query": shape,
+            "p50 ms before": p50_b,
+            "p50 ms after": p50_a,
+            "p95 ms before": percentile(b["ms"], 95),
+            "p95 ms after": percentile(a["ms"], 95),
+            "Speed-up": p50_b / p50_a if p50_a else 0.0,
+            "In-month before": sum(b["in_month"]) / len(b["in_month"]) if b["in_month"] else "-",
+            "In-month after": sum(a["in_month"]) / len(a["in_month"]) if a["in_month"] else "-",
+        })
+
+    mode = "ranked" if args.ranked else "unranked"
+    print(f"\n{mode} retrieve, top {args.top} entities, cap={args.cap}")
+    print(format_table(rows, float_cols=tuple(c for c in rows[0] if c != "Query")))
+
+
+if __name__ == "__main__":
+    main()
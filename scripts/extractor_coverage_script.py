@@ -1,21 +1,18 @@
 import json
-from preprocess.extractor import Extractor
-
-_extractor = Extractor(spacy_model="en_core_web_sm")
+import os
+from preprocess.entity_extract import extract_many
 
 def load_json(path: str):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def coverage(data):
+def coverage(data, n_process: int = 1, batch_size: int = 64):
     stats = {"entity": 0, "role": 0, "date": 0}
     n = len(data)
 
-    for ex in data:
-        q = ex["question_implicit"]
-        out = _extractor.extract(q)
-
+    questions = [ex["question_implicit"] for ex in data]
+    for out in extract_many(questions, n_process=n_process, batch_size=batch_size):
         entities = out.get("entities", [])
         dates = out.get("dates", [])
 
@@ -32,7 +29,7 @@ def coverage(data):
 if __name__ == "__main__":
     data = load_json("../official_QA_eval_set.json")
     # data = load_json("../mini_qa_devset.json")
-    stats = coverage(data)
+    stats = coverage(data, n_process=max(1, min(4, os.cpu_count() or 1)))
     for k, (v, n, p) in stats.items():
         print(f"{k:>6}: {v}/{n} ({p:.1%})")
 
@@ -4,12 +4,7 @@ import json
 import os
 from collections import Counter, defaultdict
 from typing import Any, Dict, List, Tuple
-from preprocess.extractor import Extractor
-
-_extractor = Extractor(spacy_model="en_core_web_sm")
-
-def run_extractor(question: str):
-    return _extractor.extract(question)
+from preprocess.entity_extract import extract_many
 
 
 def load_json(path: str) -> List[Dict[str, Any]]:
@@ -35,7 +30,9 @@ def entity_names(entities: List[Dict[str, Any]]) -> List[str]:
     return out
 
 
-def compute_coverage(data: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+def compute_coverage(
+    data: List[Dict[str, Any]], n_process: int = 1, batch_size: int = 64
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
     """
     Returns:
       summary: coverage metrics + distributions
@@ -46,11 +43,11 @@ def compute_coverage(data: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[D
     dist = defaultdict(Counter)
     failures: List[Dict[str, Any]] = []
 
-    for idx, ex in enumerate(data):
-        q = safe_get_question(ex)
+    questions = [safe_get_question(ex) for ex in data]
+    outputs = extract_many(questions, n_process=n_process, batch_size=batch_size)
+    for idx, (ex, q, out) in enumerate(zip(data, questions, outputs)):
         gold = ex.get("quadruple", {})
 
-        out = extract_all_entities(q)
         ents = out.get("entities", []) or []
         dates = out.get("dates", []) or []
 
@@ -197,10 +194,12 @@ def main():
     ap.add_argument("--dataset", required=True, help="Path to QA json (e.g., official_QA_eval_set.json)")
     ap.add_argument("--out_dir", default="reports", help="Output directory")
     ap.add_argument("--fail_limit", type=int, default=200, help="Max failure examples to write")
+    ap.add_argument("--n_process", type=int, default=1, help="spaCy worker processes")
+    ap.add_argument("--batch_size", type=int, default=64, help="Questions per spaCy batch")
     args = ap.parse_args()
 
     data = load_json(args.dataset)
-    summary, failures = compute_coverage(data)
+    summary, failures = compute_coverage(data, n_process=args.n_process, batch_size=args.batch_size)
 
     base = os.path.splitext(os.path.basename(args.dataset))[0]
     csv_path = os.path.join(args.out_dir, f"extractor_coverage_{base}.csv")
@@ -0,0 +1,60 @@
+"""
+Fill the triple-embedding store for an ICEWS file (e.g. a nightly drop) ahead of serving.
+
+Only triples whose text isn't stored yet are encoded, so re-running on a file
+that extends an already ingested one encodes just the new events. Safe to run
+while a server has the same store open: appends are serialized with a file
+lock, and the server picks up the new rows. Prints the indexer's backlog /
+coverage gauges while it runs.
+
+    python scripts/ingest_embeddings.py --icews icews_2014_train.txt --store .embeddings/bge-large
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from retrieval.baseline_retriever import load_events
+from retrieval.embedding_store import EmbeddingStore
+from retrieval.encoder_reranker import EncoderReranker
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--icews", default="icews_2014_train.txt")
+    ap.add_argument("--store", required=True, help="Embedding store directory")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--device", default=None)
+    ap.add_argument("--no_dedup", action="store_true")
+    ap.add_argument("--batch_size", type=int, default=256)
+    ap.add_argument("--report_every", type=float, default=10.0)
+    args = ap.parse_args()
+
+    events = load_events(args.icews, dedup=not args.no_dedup)
+    store = EmbeddingStore(args.store, args.model)
+    before = len(store)
+    encoder = EncoderReranker(model_name=args.model, device=args.device, embedding_store=store)
+    encoder.indexer.batch_size = args.batch_size
+
+    t0 = time.perf_counter()
+    encoder.ingest(events)
+    while encoder.indexer.backlog:
+        time.sleep(min(args.report_every, 1.0))
+        if time.perf_counter() - t0 >= args.report_every:
+            stats = encoder.embedding_stats()
+            print(f"[ingest] stored={stats['stored']} backlog={stats['backlog']} "
+                  f"coverage={stats['coverage']:.1%} encoded={stats['encoded']}", file=sys.stderr)
+            t0 += args.report_every
+    encoder.indexer.close()
+
+    stats = encoder.embedding_stats()
+    print(f"{len(events)} events, {len(store) - before} new vectors, {len(store)} stored "
+          f"(coverage {stats['coverage']:.1%}, failures {stats['failures']})")
+    if stats["last_error"]:
+        print(f"last error: {stats['last_error']}")
+
+
+if __name__ == "__main__":
+    main()
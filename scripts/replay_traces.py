@@ -0,0 +1,213 @@
+"""
+Replay the late pipeline stages from JSONL traces (tracing.TraceWriter).
+
+Each trace holds the retrieved / time-filtered event ids of one question. The
+events file is loaded as a plain list (no index, no spaCy), candidates are
+rebuilt from the ids, and the time filter (optionally with another tolerance),
+rerank cap and reranker are re-run. With --dev the gold quadruples are matched
+by question text to report Hit@k / MRR; with --emit_bundle the reranker inputs
+are written in the run_reranker_eval bundle format.
+
+Traces recorded on a ShardedRetriever hold global ids: replay them with
+--shards (the same shard directory) instead of --icews. A trace whose
+retriever / event count doesn't match what it is replayed on is refused.
+
+    python eval/run_eval.py --trace traces.jsonl
+    python scripts/replay_traces.py --traces traces.jsonl --dev mini_qa_devset.json \
+        --backend tfidf --tolerance 7 --emit_bundle real_bundle.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from retrieval.baseline_retriever import load_events
+from retrieval.candidate import Candidate
+from retrieval.sharded_retriever import ShardedRetriever
+from retrieval.time_filter import TimeFilter
+from run_reranker_eval import _summary, make_reranker
+from tracing import read_traces
+
+
+def load_gold(dev_path: str) -> Dict[str, Dict]:
+    """question text -> gold quadruple in bundle form (head/relation/tail/date)."""
+    with open(dev_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    gold = {}
+    for item in data:
+        q = item["quadruple"]
+        quad = {"head": q.get("s"), "relation": q.get("p"), "tail": q.get("o"), "date": q.get("t")}
+        for key in ("question_implicit", "question"):
+            if item.get(key):
+                gold[item[key]] = quad
+    return gold
+
+
+class ShardedEvents:
+    """Read-only list view of a ShardedRetriever's events by global id (shards load on demand)."""
+
+    retriever_name = "ShardedRetriever"
+
+    def __init__(self, shard_dir: str, dedup: bool = True):
+        self.retriever = ShardedRetriever(shard_dir, dedup=dedup)
+
+    def __len__(self) -> int:
+        return self.retriever.n_events
+
+    def __getitem__(self, i: int) -> Dict:
+        event = self.retriever.get_events([i])[0]
+        del event["event_id"]  # as in an events-file list
+        return event
+
+
+def check_trace(trace: Dict, events) -> None:
+    """Refuse a trace whose event ids don't index `events`."""
+    n_events = trace.get("n_events")
+    if not n_events:
+        raise ValueError("trace has no n_events (e.g. recorded on a retriever without n_events); "
+                         "can't check its event ids against the events")
+    expected = getattr(events, "retriever_name", "BaselineRetriever")
+    recorded = trace.get("retriever", "BaselineRetriever")  # traces before "retriever" was recorded
+    if recorded != expected:
+        hint = "--shards" if recorded == "ShardedRetriever" else "--icews"
+        raise ValueError(f"trace was recorded on a {recorded}, replaying on a {expected} (use {hint})")
+    if n_events != len(events):
+        raise ValueError(f"trace was recorded against {n_events} events, events have {len(events)}")
+
+
+def _is_gold(event: Dict, gold: Dict) -> bool:
+    return all(event.get(k) == gold.get(k) for k in ("head", "relation", "tail", "date"))
+
+
+def replay(
+    traces: Iterable[Dict],
+    events: List[Dict],
+    reranker=None,
+    tolerance_days: Optional[int] = None,
+    rerank_cap: Optional[int] = None,
+    top_k: Optional[int] = None,
+    from_stage: str = "retrieved",
+    gold: Optional[Dict[str, Dict]] = None,
+) -> Iterator[Dict]:
+    """
+    Yields per trace: question, gold (or None), bundle-form reranker inputs, final
+    candidates, gold rank, and whether the replayed filter output equals the traced one.
+    """
+    filters: Dict[int, TimeFilter] = {}
+    for trace in traces:
+        check_trace(trace, events)
+
+        config = trace["config"]
+        scores = dict(zip(trace["retrieved"], trace.get("retrieved_scores", ())))
+
+        def view(i: int) -> Candidate:
+            return Candidate(i, events[i], scores.get(i, 1.0))
+
+        if from_stage == "filtered":
+            filtered = [view(i) for i in trace["filtered"]]
+        else:
+            filtered = [view(i) for i in trace["retrieved"]]
+            dates = trace.get("dates") or []
+            if config.get("use_time_filter", True) and dates:
+                tol = trace["tolerance_days"] if tolerance_days is None else tolerance_days
+                tf = filters.setdefault(tol, TimeFilter(tolerance_days=tol))
+                filtered = tf.filter(filtered, dates)
+        same_filter = [c.event_id for c in filtered] == trace["filtered"]
+
+        capped = filtered[: rerank_cap or trace["rerank_cap"]]
+        k = top_k or trace["encoder_top_k"]
+        inputs = [dict(c.event, retriever_score=c.score) for c in capped]  # before rerank rewrites scores
+
+        if reranker is not None and config.get("use_reranker", True) and capped:
+            final = reranker.rerank(trace["question"], capped, top_k=k)
+        else:
+            final = capped[:k]
+
+        g = (gold or {}).get(trace["question"])
+        rank = None
+        if g is not None:
+            rank = next((r for r, c in enumerate(final, start=1) if _is_gold(c, g)), None)
+
+        yield {
+            "question": trace["question"],
+            "gold": g,
+            "inputs": inputs,
+            "final": final,
+            "rank": rank,
+            "same_filter": same_filter,
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--traces", required=True)
+    ap.add_argument("--icews", default="icews_2014_train.txt", help="Events file the traces were recorded on")
+    ap.add_argument("--shards", default=None, help="Shard directory the traces were recorded on (ShardedRetriever)")
+    ap.add_argument("--no_dedup", action="store_true", help="The traced retriever ran with dedup=False")
+    ap.add_argument("--dev", default=None, help="QA json with gold quadruples, matched by question text")
+    ap.add_argument("--backend", choices=["none", "stub", "tfidf", "encoder", "pipeline"], default="tfidf",
+                    help="'pipeline' is retrieval.encoder_reranker (the reranker process() uses)")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--from", dest="from_stage", choices=["retrieved", "filtered"], default="retrieved",
+                    help="Re-run the time filter from retrieved ids, or start from the traced filtered ids")
+    ap.add_argument("--tolerance", type=int, default=None, help="Override time_tolerance_days")
+    ap.add_argument("--rerank_cap", type=int, default=None, help="Override the traced rerank_cap")
+    ap.add_argument("--top_k", type=int, default=None, help="Override the traced encoder_top_k")
+    ap.add_argument("--emit_bundle", default=None, help="Write reranker inputs as a run_reranker_eval bundle")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.shards:
+        events = ShardedEvents(args.shards, dedup=not args.no_dedup)
+    else:
+        events = load_events(args.icews, dedup=not args.no_dedup)
+    gold = load_gold(args.dev) if args.dev else None
+
+    reranker = None
+    if args.backend == "pipeline":
+        from retrieval.encoder_reranker import EncoderReranker
+        reranker = EncoderReranker(model_name=args.model)
+    elif args.backend != "none":
+        reranker = make_reranker(args.backend, args.model)
+    load_s = time.perf_counter() - t0
+
+    bundle = open(args.emit_bundle, "w", encoding="utf-8") if args.emit_bundle else None
+    n = same = emitted = 0
+    ranks: List[Optional[int]] = []
+    t0 = time.perf_counter()
+    try:
+        if bundle:
+            bundle.write("[\n")
+        for out in replay(read_traces(args.traces), events, reranker, args.tolerance, args.rerank_cap,
+                          args.top_k, args.from_stage, gold):
+            n += 1
+            same += out["same_filter"]
+            if out["gold"] is None:
+                continue
+            ranks.append(out["rank"])
+            if bundle:
+                example = {"id": n - 1, "question": out["question"], "gold": out["gold"],
+                           "candidates": out["inputs"]}
+                bundle.write((",\n" if emitted else "") + json.dumps(example, ensure_ascii=False))
+                emitted += 1
+        if bundle:
+            bundle.write("\n]\n")
+    finally:
+        if bundle:
+            bundle.close()
+    replay_s = time.perf_counter() - t0
+
+    print(f"replayed {n} traces in {replay_s:.2f}s (+{load_s:.1f}s loading {len(events)} events)")
+    print(f"time-filter output identical to trace: {same}/{n}")
+    if gold is not None:
+        print(f"with gold: {_summary(ranks)}")
+    if bundle:
+        print(f"wrote {emitted} examples to {args.emit_bundle}")
+
+
+if __name__ == "__main__":
+    main()
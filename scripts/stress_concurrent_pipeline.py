@@ -0,0 +1,68 @@
+"""
+Stress check for running one shared TKGQAPipeline from many threads.
+
+Every question is answered once serially, then many times concurrently from a
+thread pool. Each concurrent answer must match its serial answer (same event ids,
+same scores), and the retriever's shared event dicts must stay free of
+per-request fields.
+
+    python scripts/stress_concurrent_pipeline.py --threads 16 --rounds 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pipeline import TKGQAPipeline
+
+
+def signature(results: Dict) -> List[Tuple[int, float]]:
+    return [(t["event_id"], round(t["score"], 5)) for t in results["final_triples"]]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", default="mini_qa_devset.json")
+    ap.add_argument("--icews", default="icews_2014_train.txt")
+    ap.add_argument("--graph", default="implicit_relation_graph.json")
+    ap.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        questions = [ex["question_implicit"] for ex in json.load(f)]
+
+    pipeline = TKGQAPipeline(
+        implicit_graph_path=args.graph,
+        icews_path=args.icews,
+        encoder_model_name=args.model,
+    )
+
+    expected = {q: signature(pipeline.process(q)) for q in questions}
+
+    jobs = questions * args.rounds
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        answers = list(pool.map(pipeline.process, jobs))
+    elapsed = time.perf_counter() - t0
+
+    mismatches = [r["question"] for r in answers if signature(r) != expected[r["question"]]]
+    leaked = sum(1 for e in pipeline.retriever.events if "score" in e or "retriever_score" in e)
+
+    print(f"{len(jobs)} requests on {args.threads} threads in {elapsed:.1f}s")
+    print(f"mismatches vs serial: {len(mismatches)}")
+    print(f"shared events carrying scores: {leaked}")
+    for q in sorted(set(mismatches))[:10]:
+        print(f"  ✗ {q}")
+
+    sys.exit(1 if mismatches or leaked else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Pipelined execution of TKGQAPipeline.process() across questions.
+
+The stages of one question still run in order, but each stage has its own
+worker thread and the stages are connected by bounded queues:
+
+    extraction + expansion  ->  retrieve + time filter  ->  rerank + result
+
+so question N+1 is extracted (spaCy) and retrieved (Python) while question N
+is encoded (torch, which releases the GIL). Every stage calls the same
+pipeline helpers as process(), and questions are reranked one at a time, so
+results equal process() without a latency budget (except latency_ms, which
+here runs from submit() to completion). Each question pins the index
+snapshot it was extracted on, as in process().
+
+    with StagedExecutor(pipeline) as ex:
+        for result in ex.map(questions, max_in_flight=16):
+            ...
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Iterable, Iterator
+
+from pipeline import TKGQAPipeline
+
+_STOP = object()
+
+# process() keyword arguments submit() accepts (no latency budget)
+_OPTIONS = {
+    "encoder_top_k": 10,
+    "rerank_cap": 200,
+    "use_implicit": True,
+    "use_time_filter": True,
+    "use_reranker": True,
+    "use_relation_prior": True,
+    "restrict_relations": False,
+    "compact": False,
+}
+
+
+class _Job:
+    __slots__ = ("question", "options", "future", "start", "snap", "results", "query", "filtered", "trace")
+
+    def __init__(self, question: str, options: Dict):
+        self.question = question
+        self.options = options
+        self.future: Future = Future()
+        self.start = time.perf_counter()
+        self.snap = None
+        self.results = None
+        self.query = None
+        self.filtered = None
+        self.trace = None
+
+
+class StagedExecutor:
+    def __init__(self, pipeline: TKGQAPipeline, queue_size: int = 16):
+        self.pipeline = pipeline
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(3)]
+        stages = [("analyze", self._analyze), ("retrieve", self._retrieve), ("rerank", self._rerank)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(i, fn), name=f"staged-{name}", daemon=True)
+            for i, (name, fn) in enumerate(stages)
+        ]
+        self._closed = False
+        for t in self._threads:
+            t.start()
+
+    def submit(self, question: str, **options) -> Future:
+        """Queue one question (blocks while the first stage's queue is full); the future yields its result."""
+        if self._closed:
+            raise RuntimeError("executor is closed")
+        unknown = set(options) - set(_OPTIONS)
+        if unknown:
+            raise TypeError(f"unsupported options: {sorted(unknown)}")
+        job = _Job(question, {**_OPTIONS, **options})
+        self._queues[0].put(job)
+        return job.future
+
+    def map(self, questions: Iterable[str], max_in_flight: int = 16, **options) -> Iterator[Dict]:
+        """Results in input order, with at most max_in_flight questions submitted but not yet returned."""
+        pending: "deque[Future]" = deque()
+        for question in questions:
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+            pending.append(self.submit(question, **options))
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self) -> None:
+        """Finish everything already submitted, then stop the stage threads."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queues[0].put(_STOP)
+        for t in self._threads:
+            t.join()
+
+    def __enter__(self) -> "StagedExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _run(self, i: int, fn) -> None:
+        inbox = self._queues[i]
+        outbox = self._queues[i + 1] if i + 1 < len(self._queues) else None
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                if outbox is not None:
+                    outbox.put(_STOP)
+                return
+            try:
+                fn(job)
+            except BaseException as e:
+                if job.snap is not None:
+                    self.pipeline._unpin(job.snap)
+                job.future.set_exception(e)
+                continue
+            if outbox is not None:
+                outbox.put(job)
+
+    # --- stages: the steps of TKGQAPipeline.process() ---
+
+    def _analyze(self, job: _Job) -> None:
+        p, o = self.pipeline, job.options
+        job.snap = p._pin()
+        job.results = p._new_results(
+            job.question, o["use_implicit"], o["use_time_filter"], o["use_reranker"],
+            o["use_relation_prior"], o["restrict_relations"],
+        )
+        job.results["index_version"] = job.snap.version
+        job.query = p.analyze(job.question, use_implicit=o["use_implicit"],
+                              use_relation_prior=o["use_relation_prior"], snapshot=job.snap)
+        p._record_query(job.results, job.query)
+
+    def _retrieve(self, job: _Job) -> None:
+        p, o, results = self.pipeline, job.options, job.results
+        candidates, filtered = p._candidates(job.snap, job.query, o["use_time_filter"], o["restrict_relations"])
+        results["retrieved_candidates"] = len(candidates)
+        results["after_time_filter"] = len(filtered)
+        if p.trace_writer is not None:
+            job.trace = p._trace_record(job.snap, job.question, results, job.query, candidates, filtered,
+                                        o["rerank_cap"], o["encoder_top_k"])
+        job.filtered = filtered[: o["rerank_cap"]]
+        results["rerank_input_capped"] = len(job.filtered)
+
+    def _rerank(self, job: _Job) -> None:
+        p, o = self.pipeline, job.options
+        reranker = p.encoder if o["use_reranker"] else None
+        top_triples = p._rerank(job.snap, reranker, job.question, job.filtered, o["encoder_top_k"])
+        latency_ms = (time.perf_counter() - job.start) * 1000.0
+        result = p._finish(job.results, job.query, top_triples, [], latency_ms, job.trace, o["compact"])
+        p._unpin(job.snap)
+        job.snap = None
+        job.future.set_result(result)
+
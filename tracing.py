@@ -0,0 +1,108 @@
+"""
+Per-question JSONL traces of TKGQAPipeline.process().
+
+TraceWriter.write() only enqueues the record; a background thread serializes
+records as compact JSON lines and appends them in batches (every flush_every
+records or flush_interval seconds). When the queue is full, records are dropped
+and counted rather than blocking the request. One record per question:
+
+    {"v": 1, "ts": ..., "question": ..., "config": {...}, "entities": [{"name", "type"}],
+     "dates": [...], "expanded": [...], "relations": [...], "tolerance_days": 30,
+     "rerank_cap": 200, "encoder_top_k": 10, "retriever": "BaselineRetriever",
+     "n_events": ..., "index_version": 1,
+     "retrieved": [event ids], "retrieved_scores": [...] (ranked retrieval only),
+     "filtered": [event ids], "final": [event ids], "latency_ms": ...}
+
+Event ids index the retriever's events (retrieval.baseline_retriever.load_events
+on the same file and dedup setting, or a ShardedRetriever's global ids), so
+scripts/replay_traces.py can re-run the time filter and reranker without spaCy
+or retrieval.
+
+The writer thread is per process: create the writer after forking.
+"""
+import json
+import queue
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+TRACE_VERSION = 1
+
+_STOP = object()
+
+
+class TraceWriter:
+    def __init__(self, path: str, flush_every: int = 256, flush_interval: float = 1.0,
+                 max_pending: int = 10_000):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+
+    def write(self, record: Dict) -> None:
+        """Enqueue one record (not copied: don't mutate it afterwards)."""
+        if self._closed:
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        buf = []
+        last_flush = time.monotonic()
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                try:
+                    record = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    record = None
+                stop = record is _STOP
+                if record is not None and not stop:
+                    buf.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+
+                now = time.monotonic()
+                if buf and (stop or len(buf) >= self.flush_every or now - last_flush >= self.flush_interval):
+                    f.write("\n".join(buf) + "\n")
+                    f.flush()
+                    self.written += len(buf)
+                    buf = []
+                    last_flush = now
+                if stop:
+                    return
+
+    def close(self) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_traces(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)